@@ -0,0 +1,91 @@
+"""
+Benchmark: marking delivered notifications with `crud.mark_notifications_not_pending`.
+
+Compares the previous implementation, which loaded every notification as an ORM object and
+flipped `delivered` in Python, with the chunked set-based UPDATE. Each run marks the same
+number of pending notifications in a fresh SQLite file.
+
+    python -m benchmarks.bench_mark_delivered [--ids 10000] [--repeat 3]
+"""
+
+import argparse
+import os
+import tempfile
+import time
+from typing import Callable
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session, sessionmaker
+
+from db import crud
+from db.models import Base, Notification
+from db.session import create_db_engine
+
+
+def mark_orm(session: Session, notification_ids: list[str]) -> None:
+    """
+    The implementation before the set-based UPDATE
+    """
+    notifications = (
+        session.query(Notification).filter(Notification.id.in_(notification_ids)).all()
+    )
+
+    for notification in notifications:
+        notification.delivered = True
+    crud.safe_commit(session)
+
+
+def run(mark: Callable[[Session, list[str]], None], ids: int) -> float:
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_db_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        Base.metadata.create_all(engine)
+        Session = sessionmaker(bind=engine)
+
+        rows = [
+            {
+                "id": f"n{n}",
+                "type": "comment",
+                "author": "bench",
+                "content": "x" * 500,
+                "url": "https://reddit.com/",
+                "created_utc": n,
+            }
+            for n in range(ids)
+        ]
+
+        with Session() as session:
+            crud.add_notifications_to_db(session, rows)
+
+        with Session() as session:
+            start = time.perf_counter()
+            mark(session, [row["id"] for row in rows])
+            elapsed = time.perf_counter() - start
+
+        with Session() as session:
+            pending = session.scalar(
+                select(func.count()).where(Notification.delivered.is_(False))
+            )
+
+        engine.dispose()
+
+        if pending:
+            raise RuntimeError(f"{pending} notifications still pending")
+
+        return elapsed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--ids", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{args.ids} ids, best of {args.repeat}")
+    print(f"{'implementation':<16} {'seconds':>8}")
+
+    for name, mark in (
+        ("orm", mark_orm),
+        ("set-based", crud.mark_notifications_not_pending),
+    ):
+        best = min(run(mark, args.ids) for _ in range(args.repeat))
+        print(f"{name:<16} {best:>8.3f}")
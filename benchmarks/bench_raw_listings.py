@@ -0,0 +1,116 @@
+"""
+Benchmark: reading a comment listing with praw's objector versus `raw_listings.parse_listing`.
+
+Both paths start from the decoded JSON of a synthetic listing, so no request is made. The praw
+path builds Comment models with `reddit._objector` like praw's listing generators do, the raw
+path builds slotted ListingItem records. Each item is then turned into a notifications row with
+`crud.comment_to_row`, like the persist stage does.
+
+Reports the time per item for parsing plus row building, and the memory the parsed items keep
+alive per item (tracemalloc).
+
+    python -m benchmarks.bench_raw_listings [--items 100] [--repeat 200]
+"""
+
+import argparse
+import time
+import tracemalloc
+from typing import Any, Callable
+
+import praw
+
+from db import crud
+from reddit_bot.raw_listings import parse_listing
+
+
+def make_listing(items: int) -> dict:
+    now = time.time()
+
+    return {
+        "kind": "Listing",
+        "data": {
+            "after": None,
+            "before": None,
+            "dist": items,
+            "children": [
+                {
+                    "kind": "t1",
+                    "data": {
+                        "id": f"c{n:05d}",
+                        "name": f"t1_c{n:05d}",
+                        "author": f"bench_user_{n % 20}",
+                        "author_fullname": f"t2_u{n % 20}",
+                        "body": "x" * 300,
+                        "body_html": "<div>" + "x" * 300 + "</div>",
+                        "permalink": f"/r/python/comments/abc/title/c{n:05d}/",
+                        "link_id": "t3_abc",
+                        "parent_id": "t3_abc",
+                        "created_utc": now - n,
+                        "is_submitter": False,
+                        "subreddit": "python",
+                        "subreddit_id": "t5_2qh0y",
+                        "score": 1,
+                        "ups": 1,
+                        "replies": "",
+                    },
+                }
+                for n in range(items)
+            ],
+        },
+    }
+
+
+def parse_praw(reddit: praw.Reddit, listing: dict) -> list[Any]:
+    return list(reddit._objector.objectify(listing).children)
+
+
+def per_item_seconds(
+    parse: Callable[[dict], list[Any]], listing: dict, repeat: int
+) -> float:
+    items = len(listing["data"]["children"])
+    start = time.perf_counter()
+
+    for _ in range(repeat):
+        for item in parse(listing):
+            crud.comment_to_row(item)
+
+    return (time.perf_counter() - start) / (repeat * items)
+
+
+def per_item_bytes(parse: Callable[[dict], list[Any]], listing: dict) -> float:
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    parsed = parse(listing)
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+
+    retained = sum(stat.size_diff for stat in after.compare_to(before, "filename"))
+
+    return retained / len(parsed)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--items", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    # Never authenticates, the objector only needs a Reddit instance
+    reddit = praw.Reddit(
+        client_id="bench",
+        client_secret="bench",
+        user_agent="bench_raw_listings",
+        check_for_updates=False,
+    )
+    listing = make_listing(args.items)
+
+    print(f"{args.items} comments per listing, {args.repeat} runs")
+    print(f"{'parser':<8} {'us/item':>8} {'bytes/item':>11}")
+
+    for name, parse in (
+        ("praw", lambda data: parse_praw(reddit, data)),
+        ("raw", parse_listing),
+    ):
+        seconds = per_item_seconds(parse, listing, args.repeat)
+        size = per_item_bytes(parse, listing)
+        print(f"{name:<8} {seconds * 1e6:>8.1f} {size:>11.0f}")
@@ -0,0 +1,162 @@
+"""
+Benchmark: lock contention of the SQLite engine profiles under concurrent writers.
+
+Runs the same workload against a fresh SQLite file once per engine profile. Writer processes
+mimic the watcher and the Telegram bot: they insert notification batches and update a shared
+watched redditor (read-modify-write), committing through `crud.safe_commit`. Reader processes
+keep reading the first page of pending notifications like `send_pending_notifications` does.
+
+Both engines are built like the app builds them: "default" is the baseline engine of the
+original code, pysqlite with its 5s lock timeout and no PRAGMAs. While waiting out that timeout
+a writer is blocked, not failing, so retries stay rare. The time writers spend blocked shows up
+in the round latencies instead.
+
+Reports the lock retries counted by `crud.commit_stats`, the rounds that still failed, the mean
+and max latency of a write round (insert batch plus rating update) and the wall time the
+writers needed.
+
+    python -m benchmarks.bench_sqlite_profile [--workers 4] [--readers 2] [--rounds 200]
+"""
+
+import argparse
+import multiprocessing
+import os
+import tempfile
+import time
+
+from sqlalchemy.orm import sessionmaker
+
+from db import crud
+from db.models import Base, WatchedRedditor
+from db.session import SQLITE_PROFILES, create_db_engine
+
+
+def worker(url: str, profile: str, worker_id: int, rounds: int, results) -> None:
+    engine = create_db_engine(url, profile)
+    Session = sessionmaker(bind=engine)
+    failures = 0
+    latencies = []
+
+    for i in range(rounds):
+        session = Session()
+        started = time.perf_counter()
+
+        try:
+            rows = [
+                {
+                    "id": f"{worker_id}_{i}_{n}",
+                    "type": "comment",
+                    "author": "bench",
+                    "content": "x" * 200,
+                    "url": "https://reddit.com/",
+                    "created_utc": int(time.time()),
+                }
+                for n in range(10)
+            ]
+            crud.add_notifications_to_db(session, rows)
+            crud.set_redditor_rating(session, "bench", 1)
+
+        except Exception:
+            session.rollback()
+            failures += 1
+
+        finally:
+            session.close()
+            latencies.append(time.perf_counter() - started)
+
+    results.put((crud.commit_stats["lock_retries"], failures, latencies))
+
+
+def reader(url: str, profile: str, stop) -> None:
+    engine = create_db_engine(url, profile)
+    Session = sessionmaker(bind=engine)
+
+    while not stop.is_set():
+        session = Session()
+
+        try:
+            crud.get_pending_notifications_page(session, None, 200)
+
+        except Exception:
+            pass
+
+        finally:
+            session.close()
+
+
+def run(
+    profile: str, workers: int, readers: int, rounds: int
+) -> tuple[int, int, list[float], float]:
+    with tempfile.TemporaryDirectory() as tmp:
+        url = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        engine = create_db_engine(url, profile)
+        Base.metadata.create_all(engine)
+        Session = sessionmaker(bind=engine)
+
+        with Session() as session:
+            session.add(WatchedRedditor(username="bench", active=True))
+            session.commit()
+
+        engine.dispose()
+
+        results = multiprocessing.Queue()
+        processes = [
+            multiprocessing.Process(
+                target=worker, args=(url, profile, n, rounds, results)
+            )
+            for n in range(workers)
+        ]
+
+        stop = multiprocessing.Event()
+        reader_processes = [
+            multiprocessing.Process(target=reader, args=(url, profile, stop))
+            for _ in range(readers)
+        ]
+
+        for p in reader_processes:
+            p.start()
+
+        start = time.perf_counter()
+        for p in processes:
+            p.start()
+        for p in processes:
+            p.join()
+        elapsed = time.perf_counter() - start
+
+        stop.set()
+        for p in reader_processes:
+            p.join()
+
+        retries = failures = 0
+        latencies: list[float] = []
+        for _ in processes:
+            r, f, l = results.get()
+            retries += r
+            failures += f
+            latencies += l
+
+        return retries, failures, latencies, elapsed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--readers", type=int, default=2)
+    parser.add_argument("--rounds", type=int, default=200)
+    args = parser.parse_args()
+
+    print(f"{args.workers} writers x {args.rounds} rounds, {args.readers} readers")
+    print(
+        f"{'profile':<12} {'lock retries':>12} {'failed':>8} "
+        f"{'mean ms':>8} {'max ms':>8} {'seconds':>8}"
+    )
+
+    for profile in SQLITE_PROFILES:
+        retries, failures, latencies, elapsed = run(
+            profile, args.workers, args.readers, args.rounds
+        )
+        mean = sum(latencies) / len(latencies) * 1000
+        print(
+            f"{profile:<12} {retries:>12} {failures:>8} "
+            f"{mean:>8.1f} {max(latencies) * 1000:>8.1f} {elapsed:>8.2f}"
+        )
@@ -13,16 +13,83 @@ REDDIT_CLIENT_ID = os.getenv("REDDIT_CLIENT_ID")
 REDDIT_CLIENT_SECRET = os.getenv("REDDIT_CLIENT_SECRET")
 REDDIT_USER_AGENT = os.getenv("REDDIT_USER_AGENT", "RedditWatcher/1.0")
 
+# Connections kept open by the shared Reddit client, also the number of parallel lookups
+REDDIT_HTTP_POOL_SIZE = 10
+
+# Seconds a redditor/subreddit existence check is cached, found and not found
+REDDIT_EXISTS_TTL = 3600
+REDDIT_NOT_FOUND_TTL = 300
+
 # Telegram API
 TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
 
-# Poll intervals
+# Telegram delivery limits: messages per second overall and per chat, chats served at once
+TELEGRAM_GLOBAL_RATE = 30
+TELEGRAM_CHAT_RATE = 1
+TELEGRAM_MAX_CONCURRENCY = 50
+
+# Poll intervals. Reddit listings start at REDDIT_POLL_INTERVAL and adapt to their traffic
+# between the min and max interval
 REDDIT_POLL_INTERVAL = 5
+REDDIT_POLL_MIN_INTERVAL = 1
+REDDIT_POLL_MAX_INTERVAL = 60
+NOTIFICATION_POLL_INTERVAL = 5
+
+# Pending notifications read per query when the sender drains the backlog
+NOTIFICATION_PAGE_SIZE = 200
+
+# Unix socket the watcher uses to wake up the Telegram sender. Set by main.py, empty disables it
+NOTIFY_SOCKET_PATH = os.getenv("REDDIT_WATCHER_NOTIFY_SOCKET", "")
+
+# How listings are read: "raw" parses the listing JSON into slim records, "praw" builds full
+# praw models, "httpx" fetches all subreddit listings concurrently on an async client and
+# parses them like "raw"
+REDDIT_FETCHER = os.getenv("REDDIT_FETCHER", "raw")
 
 # Subreddits Watchlist intervals
 WATCHLIST_UPDATE_INTERVAL = 5
 
+# Sharding of the subreddit watchlist: minimum number of shards, longest multireddit
+# string per shard, seconds between rebalancing the shards by observed traffic
+REDDIT_SHARD_COUNT = int(os.getenv("REDDIT_SHARD_COUNT", "1"))
+REDDIT_SHARD_MAX_CHARS = 2000
+REDDIT_SHARD_REBALANCE_INTERVAL = 600
+
+# Ingestion mode: "firehose" reads the subreddit listings, "authors" the listings of each
+# watched redditor, "auto" picks the cheaper one by watchlist size and subreddit volume. In
+# author mode the subreddit listings are still probed once per rebalance interval, which keeps
+# their traffic numbers and checkpoints current
+REDDIT_INGESTION_MODE = os.getenv("REDDIT_INGESTION_MODE", "auto")
+REDDIT_AUTHOR_MIN_INTERVAL = 30
+REDDIT_AUTHOR_MAX_INTERVAL = 300
+REDDIT_AUTHORS_PER_PASS = 20
+
+# Ingestion pipeline: fetch passes buffered in front of the filter and persist stages, and what
+# happens when the filter stage falls behind: "block", "drop_oldest" or "drop_newest". Drops
+# lose notifications, the stream checkpoints are held before them until the next restart
+INGEST_QUEUE_SIZE = 8
+INGEST_BACKPRESSURE = os.getenv("INGEST_BACKPRESSURE", "block")
+
+# Notification writer: flush after this many rows or this many seconds
+NOTIFICATION_BATCH_SIZE = 50
+NOTIFICATION_FLUSH_INTERVAL = 1.0
+
+# Fullnames of stored notifications remembered to drop repeats before the DB, filled from the
+# newest rows on startup
+NOTIFICATION_SEEN_CACHE_SIZE = 10000
+
+# Notification retention: delivered notifications older than the max age or beyond the newest
+# max rows are moved to gzip JSONL archives, one file per day, and deleted. 0 disables a limit
+NOTIFICATION_RETENTION_DAYS = int(os.getenv("NOTIFICATION_RETENTION_DAYS", "30"))
+NOTIFICATION_RETENTION_MAX_ROWS = int(os.getenv("NOTIFICATION_RETENTION_MAX_ROWS", "0"))
+NOTIFICATION_ARCHIVE_DIR = os.getenv("NOTIFICATION_ARCHIVE_DIR", "archive")
+NOTIFICATION_RETENTION_BATCH_SIZE = 500
+NOTIFICATION_RETENTION_INTERVAL = 3600
+
 """
 Database URL
 """
 DB_URL = "sqlite:///reddit_watcher.db"
+
+# SQLite PRAGMA profile, see db/session.py. "default" keeps the stock SQLite settings
+DB_PROFILE = os.getenv("DB_PROFILE", "performance")
@@ -0,0 +1,186 @@
+import heapq
+import threading
+import time
+from collections import OrderedDict
+from typing import Iterable
+
+"""IN-PROCESS CACHES"""
+
+
+class MuteCache:
+    """
+    In-process copy of `muted_until` for all watched redditors.
+
+    Currently muted redditors are kept in a set and their expiry times in a min-heap, so a mute
+    running out only costs a heap pop on the next lookup instead of a DB query per item.
+    Redditors the cache does not know about count as muted, same as `crud.is_muted`.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._muted_until: dict[str, float] = {}
+        self._muted: set[str] = set()
+        self._expiries: list[tuple[float, str]] = []
+
+    def load(self, timers: dict[str, float]) -> None:
+        """
+        Replace the cache content with a {username: muted_until} mapping.
+        """
+        now = time.time()
+        muted_until = {name.casefold(): until for name, until in timers.items()}
+        expiries = [(until, name) for name, until in muted_until.items() if until > now]
+        heapq.heapify(expiries)
+
+        with self._lock:
+            self._muted_until = muted_until
+            self._muted = {name for _, name in expiries}
+            self._expiries = expiries
+
+    def set(self, username: str, muted_until: float) -> None:
+        """
+        Update a single redditor after a mute was set or cleared.
+        """
+        name = username.casefold()
+
+        with self._lock:
+            self._muted_until[name] = muted_until
+
+            if muted_until > time.time():
+                self._muted.add(name)
+                heapq.heappush(self._expiries, (muted_until, name))
+            else:
+                self._muted.discard(name)
+
+    def is_muted(self, username: str, now: float | None = None) -> bool:
+        name = username.casefold()
+        now = time.time() if now is None else now
+
+        with self._lock:
+            self._expire(now)
+
+            if name not in self._muted_until:
+                return True
+
+            return name in self._muted
+
+    def _expire(self, now: float) -> None:
+        while self._expiries and self._expiries[0][0] <= now:
+            until, name = heapq.heappop(self._expiries)
+
+            # Stale heap entries from an earlier mute of the same redditor are skipped
+            if self._muted_until.get(name) == until:
+                self._muted.discard(name)
+
+
+mute_cache = MuteCache()
+
+
+class SeenIdCache:
+    """
+    Bounded LRU set of Reddit fullnames that already have a notification row.
+
+    Items seen again because listings overlap, shards return the same item or a restart
+    replays the listing are dropped here instead of costing a trip to the DB. Keeps hit and
+    miss counters for the hit rate.
+    """
+
+    def __init__(self, max_size: int = 10000) -> None:
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._ids: OrderedDict[str, None] = OrderedDict()
+
+    def warm(self, fullnames: Iterable[str]) -> None:
+        """
+        Adds known fullnames, oldest first, without counting them as lookups.
+        """
+        with self._lock:
+            for fullname in fullnames:
+                self._remember(fullname)
+
+    def check_and_add(self, fullname: str) -> bool:
+        """
+        Returns True if the fullname was seen before, remembers it otherwise.
+        """
+        with self._lock:
+            if fullname in self._ids:
+                self._ids.move_to_end(fullname)
+                self.hits += 1
+                return True
+
+            self.misses += 1
+            self._remember(fullname)
+            return False
+
+    def _remember(self, fullname: str) -> None:
+        self._ids[fullname] = None
+        self._ids.move_to_end(fullname)
+
+        while len(self._ids) > self.max_size:
+            self._ids.popitem(last=False)
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def report(self) -> dict:
+        return {
+            "size": len(self._ids),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hit_rate, 3),
+        }
+
+
+class ExistenceCache:
+    """
+    Remembers which redditors and subreddits exist on Reddit.
+
+    Positive results are kept for `ttl` seconds, negative ones for `negative_ttl`, a name that
+    was just created or unbanned is picked up again soon. The oldest entries are dropped once
+    the cache holds `max_size` names.
+    """
+
+    def __init__(
+        self, ttl: float, negative_ttl: float, max_size: int = 10000
+    ) -> None:
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._entries: dict[tuple[str, str], tuple[bool, float]] = {}
+
+    def get(self, kind: str, name: str, now: float | None = None) -> bool | None:
+        """
+        Returns the cached result, None if unknown or expired.
+        """
+        key = (kind, name.casefold())
+        now = time.time() if now is None else now
+
+        with self._lock:
+            entry = self._entries.get(key)
+
+            if entry is None:
+                return None
+
+            exists, expires = entry
+
+            if expires <= now:
+                del self._entries[key]
+                return None
+
+            return exists
+
+    def set(self, kind: str, name: str, exists: bool, now: float | None = None) -> None:
+        key = (kind, name.casefold())
+        now = time.time() if now is None else now
+        expires = now + (self.ttl if exists else self.negative_ttl)
+
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (exists, expires)
+
+            while len(self._entries) > self.max_size:
+                del self._entries[next(iter(self._entries))]
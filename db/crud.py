@@ -1,24 +1,45 @@
 import time
 import logging
+from collections import Counter
 
 from praw.models import Comment, Submission
+from sqlalchemy import delete, func, literal_column, select, tuple_, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.exc import OperationalError
 from sqlalchemy.orm import Session
 
+from .cache import mute_cache
 from .exceptions import (
-    RedditorAlreadyActiveError,
     RedditorAlreadyInactiveError,
     RedditorAlreadyMutedError,
-    RedditorDoesNotExistError,
     RedditorNotFoundInDBError,
-    SubredditAlreadyActiveError,
     SubredditAlreadyInactiveError,
     SubredditNotFoundError,
 )
-from .models import Notification, TelegramUser, WatchedRedditor, WatchedSubreddit
+from .models import (
+    Notification,
+    StreamCheckpoint,
+    TelegramUser,
+    WatchedRedditor,
+    WatchedSubreddit,
+)
 
 logger = logging.getLogger("reddit_watcher." + __name__)
 
+# Commit statistics of this process, e.g. how often safe_commit hit a locked database
+commit_stats: Counter[str] = Counter()
+
+# Fullname prefixes of the notification types
+FULLNAME_PREFIXES = {"comment": "t1", "submission": "t3"}
+
+# Outcomes of the bulk watchlist inserts
+ADDED = "added"
+REACTIVATED = "reactivated"
+ALREADY_ACTIVE = "already_active"
+
+# Bound parameters per IN (...) query, well below SQLite's limit
+IN_CHUNK_SIZE = 500
+
 
 def safe_commit(session: Session, retries: int = 3, delay: float = 0.5) -> None:
     """
@@ -31,6 +52,7 @@ def safe_commit(session: Session, retries: int = 3, delay: float = 0.5) -> None:
 
         except OperationalError as e:
             if "database is locked" in str(e).lower():
+                commit_stats["lock_retries"] += 1
                 logger.warning(
                     f"[DB] Database is locked, retrying ({attempt+1}/{retries})..."
                 )
@@ -46,6 +68,39 @@ def safe_commit(session: Session, retries: int = 3, delay: float = 0.5) -> None:
     raise RuntimeError("[DB] Failed to commit after multiple retries.")
 
 
+def _activate_all(session: Session, model: type, column, names: list[str]) -> dict[str, str]:
+    """
+    Inserts or reactivates all `names` of a watchlist model and commits once.
+    """
+    names = list(dict.fromkeys(name.strip() for name in names if name.strip()))
+    existing = {}
+
+    for start in range(0, len(names), IN_CHUNK_SIZE):
+        chunk = names[start : start + IN_CHUNK_SIZE]
+        for row in session.query(model).filter(column.in_(chunk)):
+            existing[getattr(row, column.key)] = row
+
+    result = {}
+
+    for name in names:
+        row = existing.get(name)
+
+        if row is None:
+            session.add(model(**{column.key: name, "active": True}))
+            result[name] = ADDED
+
+        elif not row.active:
+            row.active = True
+            result[name] = REACTIVATED
+
+        else:
+            result[name] = ALREADY_ACTIVE
+
+    safe_commit(session)
+
+    return result
+
+
 """SUBREDDITS"""
 
 
@@ -58,27 +113,11 @@ def get_watched_subreddits(session: Session) -> list[str]:
     return [row[0] for row in rows]
 
 
-def add_watched_subreddit(session: Session, subreddit_name: str) -> str:
+def add_watched_subreddits(session: Session, subreddit_names: list[str]) -> dict[str, str]:
     """
-    Adds a subreddit to the watchlist
+    Adds or reactivates many subreddits in one transaction. Returns the outcome per name.
     """
-    name = subreddit_name.strip()
-
-    existing = session.query(WatchedSubreddit).filter_by(name=name).first()
-
-    if existing:
-        if not existing.active:
-            existing.active = True
-            safe_commit(session)
-            return f"Reactivated subreddit: {name}"
-
-        raise SubredditAlreadyActiveError(f"{name} is already beeing watched")
-
-    new_subreddit = WatchedSubreddit(name=name, active=True)
-    session.add(new_subreddit)
-    safe_commit(session)
-
-    return f"Added new subreddit: {name}"
+    return _activate_all(session, WatchedSubreddit, WatchedSubreddit.name, subreddit_names)
 
 
 def remove_watched_subreddit(session: Session, subreddit_name: str) -> str:
@@ -126,36 +165,22 @@ def get_watched_redditors_with_rating(session: Session) -> list[tuple[str, int]]
 
 def get_muted_watched_redditors(session: Session) -> list[str]:
     """
-    Gets all the redditors that are currently muted
+    Gets all the redditors that are currently muted, in one query
     """
-    redditors = [row.username for row in session.query(WatchedRedditor).all()]
-    muted_redditors = [
-        redditor for redditor in redditors if is_muted(session, redditor)
-    ]
+    rows = (
+        session.query(WatchedRedditor.username)
+        .filter(WatchedRedditor.muted_until > time.time())
+        .all()
+    )
 
-    return muted_redditors
+    return [row.username for row in rows]
 
 
-def add_watched_redditor(session: Session, username: str) -> None:
+def add_watched_redditors(session: Session, usernames: list[str]) -> dict[str, str]:
     """
-    Add a redditor to the watched_users table if not already present.
+    Adds or reactivates many redditors in one transaction. Returns the outcome per name.
     """
-    username = username.strip()
-
-    existing = session.query(WatchedRedditor).filter_by(username=username).first()
-    if existing:
-        if not existing.active:
-            existing.active = True
-            safe_commit(session)
-            raise RedditorDoesNotExistError(f"User does not exist on Reddit {username}")
-
-        raise RedditorAlreadyActiveError(f"User already being watched: {username}")
-
-    new_user = WatchedRedditor(username=username, active=True)
-    session.add(new_user)
-    safe_commit(session)
-
-    return
+    return _activate_all(session, WatchedRedditor, WatchedRedditor.username, usernames)
 
 
 def remove_watched_redditor(session: Session, username: str) -> None:
@@ -192,6 +217,19 @@ def is_muted(session: Session, username: str) -> bool:
         return False
 
 
+def get_mute_timers(session: Session) -> dict[str, float]:
+    """
+    Gets the muted_until timestamp of all watched redditors
+    """
+    rows = (
+        session.query(WatchedRedditor.username, WatchedRedditor.muted_until)
+        .filter_by(active=True)
+        .all()
+    )
+
+    return {username: muted_until for username, muted_until in rows}
+
+
 def set_redditor_mute_timer(session: Session, username: str, mute_time: float) -> str:
     """
     Mute a user for a specified time
@@ -207,6 +245,7 @@ def set_redditor_mute_timer(session: Session, username: str, mute_time: float) -
 
     user.muted_until = mute_time + time.time()
     safe_commit(session)
+    mute_cache.set(user.username, user.muted_until)
 
     return f"Muted user: {username}"
 
@@ -225,6 +264,7 @@ def unset_redditor_mute_timer(session: Session, username: str) -> str:
 
     user.muted_until = time.time() - 1
     safe_commit(session)
+    mute_cache.set(user.username, user.muted_until)
 
     return f"unmuted {username}"
 
@@ -245,69 +285,151 @@ def set_redditor_rating(session: Session, username: str, rating: int) -> str:
     return f"Changed rating for: {username}"
 
 
-def get_rating(session: Session, username: str) -> int:
+def get_ratings(session: Session, usernames: list[str]) -> dict[str, int]:
     """
-    Get the rating of a redditor
+    Get the ratings of many redditors at once, keyed by the names as given. Names match case
+    insensitively like the watchlist does, an active redditor wins over an inactive one of the
+    same name. Unknown redditors are left out.
     """
-    username = username.strip()
+    # SQLite's lower() only folds ASCII, which is all Reddit allows in names
+    names_by_key: dict[str, list[str]] = {}
 
-    user = session.query(WatchedRedditor).filter_by(username=username).first()
-    if not user:
-        raise RedditorNotFoundInDBError(f"User not found: {username}")
+    for username in dict.fromkeys(username.strip() for username in usernames):
+        names_by_key.setdefault(username.lower(), []).append(username)
+
+    keys = list(names_by_key)
+    ratings = {}
 
-    return user.rating
+    for start in range(0, len(keys), IN_CHUNK_SIZE):
+        chunk = keys[start : start + IN_CHUNK_SIZE]
+        rows = (
+            session.query(WatchedRedditor.username, WatchedRedditor.rating)
+            .filter(func.lower(WatchedRedditor.username).in_(chunk))
+            .order_by(WatchedRedditor.active.asc())
+        )
+
+        for row in rows:
+            for name in names_by_key[row.username.lower()]:
+                ratings[name] = row.rating
+
+    return ratings
 
 
 """SUBMISSIONS"""
 
 
-def add_comment_to_db(session: Session, comment: Comment) -> str:
+def comment_to_row(comment: Comment) -> dict:
+    """
+    Builds a notifications row from a comment
+    """
+    return {
+        "id": comment.id,
+        "type": "comment",
+        "author": str(comment.author),
+        "content": comment.body,
+        "url": f"https://reddit.com{comment.permalink}",
+        "created_utc": int(comment.created_utc),
+    }
+
+
+def submission_to_row(submission: Submission) -> dict:
+    """
+    Builds a notifications row from a submission
+    """
+    return {
+        "id": submission.id,
+        "type": "submission",
+        "author": str(submission.author),
+        "content": submission.title,
+        "url": f"https://reddit.com{submission.permalink}",
+        "created_utc": int(submission.created_utc),
+    }
+
+
+def add_notifications_to_db(session: Session, rows: list[dict]) -> list[str]:
     """
-    Adds a comment to the notifications table
+    Adds many notifications in one multi-row INSERT. Rows whose id already exists are skipped.
+    Returns the ids that were actually inserted.
     """
-    notification = Notification(
-        id=comment.id,
-        type="comment",
-        author=str(comment.author),
-        content=comment.body,
-        url=f"https://reddit.com{comment.permalink}",
-        created_utc=int(comment.created_utc),
+    if not rows:
+        return []
+
+    stmt = (
+        sqlite_insert(Notification)
+        .values(rows)
+        .on_conflict_do_nothing(index_elements=[Notification.id])
+        .returning(Notification.id)
     )
-    session.merge(notification)
+    inserted = list(session.execute(stmt).scalars().all())
     safe_commit(session)
 
-    return "comment added"
+    return inserted
+
+
+def row_fullname(row: dict) -> str:
+    """
+    Reddit fullname of a notifications row built by `comment_to_row` / `submission_to_row`
+    """
+    return f"{FULLNAME_PREFIXES[row['type']]}_{row['id']}"
 
 
-def add_submission_to_db(session: Session, submission: Submission) -> str:
+def get_recent_notification_fullnames(session: Session, limit: int) -> list[str]:
     """
-    Adds a submission to the notifications table
+    Fullnames of the last `limit` stored notifications, oldest first. Walks the table backwards
+    by rowid, which follows insertion order, instead of sorting it.
     """
-    notfication = Notification(
-        id=submission.id,
-        type="submission",
-        author=str(submission.author),
-        content=submission.title,
-        url=f"https://reddit.com{submission.permalink}",
-        created_utc=int(submission.created_utc),
+    rows = (
+        session.query(Notification.type, Notification.id)
+        .order_by(literal_column("rowid").desc())
+        .limit(limit)
+        .all()
     )
-    session.merge(notfication)
-    safe_commit(session)
 
-    return "submission added"
+    return [
+        f"{FULLNAME_PREFIXES.get(type_, 't1')}_{id_}" for type_, id_ in reversed(rows)
+    ]
 
 
-def get_pending_notifications(session: Session) -> list[Notification]:
+def get_pending_notifications_page(
+    session: Session, after: tuple[int, str] | None, limit: int
+) -> list[dict]:
     """
-    Return all undelivered notifications
+    Returns the next `limit` undelivered notifications after the (created_utc, id) keyset
+    `after`, oldest first. Only the columns delivery needs are loaded, not the content, plus
+    the author's current rating (None if the author is not in watched_users).
+
+    The author matches case insensitively like the watchlist does. A subquery instead of a
+    join, two watched_users rows differing in case must not return a notification twice.
     """
-    return (
-        session.query(Notification)
-        .filter_by(delivered=False)
-        .order_by(Notification.created_utc.asc())
+    rating = (
+        select(WatchedRedditor.rating)
+        .where(func.lower(WatchedRedditor.username) == func.lower(Notification.author))
+        .order_by(WatchedRedditor.active.desc())
+        .limit(1)
+        .scalar_subquery()
+    )
+    query = session.query(
+        Notification.id,
+        Notification.type,
+        Notification.author,
+        Notification.url,
+        Notification.created_utc,
+        rating.label("rating"),
+    ).filter(Notification.delivered.is_(False))
+
+    if after is not None:
+        query = query.filter(
+            tuple_(Notification.created_utc, Notification.id) > tuple_(*after)
+        )
+
+    rows = (
+        query.order_by(Notification.created_utc.asc(), Notification.id.asc())
+        .limit(limit)
         .all()
     )
 
+    return [row._asdict() for row in rows]
+
 
 def get_notifications(session: Session) -> list[list[str]]:
     """
@@ -321,13 +443,140 @@ def mark_notifications_not_pending(
 ) -> None:
     """
     Mark all sent notifications as not pending
+
+    One set-based UPDATE per chunk of ids, all in one transaction. Nothing is loaded into the
+    session.
+    """
+    ids = list(notification_ids)
+
+    for start in range(0, len(ids), IN_CHUNK_SIZE):
+        session.execute(
+            update(Notification)
+            .where(Notification.id.in_(ids[start : start + IN_CHUNK_SIZE]))
+            .values(delivered=True)
+            .execution_options(synchronize_session=False)
+        )
+
+    safe_commit(session)
+
+    return
+
+
+"""RETENTION"""
+
+
+def get_retention_boundary(
+    session: Session, cutoff: float | None, max_rows: int | None
+) -> tuple[float, str] | None:
+    """
+    Keyset (created_utc, id) below which delivered notifications are expired: older than
+    `cutoff`, or older than the newest `max_rows` delivered ones. None if nothing expires.
+    """
+    bounds: list[tuple[float, str]] = []
+
+    if cutoff:
+        bounds.append((cutoff, ""))
+
+    if max_rows:
+        oldest_kept = (
+            session.query(Notification.created_utc, Notification.id)
+            .filter(Notification.delivered.is_(True))
+            .order_by(Notification.created_utc.desc(), Notification.id.desc())
+            .offset(max_rows - 1)
+            .limit(1)
+            .first()
+        )
+
+        if oldest_kept:
+            bounds.append((oldest_kept.created_utc, oldest_kept.id))
+
+    return max(bounds) if bounds else None
+
+
+def get_expired_notifications(
+    session: Session, before: tuple[float, str], limit: int
+) -> list[dict]:
     """
-    notifications = (
-        session.query(Notification).filter(Notification.id.in_(notification_ids)).all()
+    Returns up to `limit` delivered notifications below the keyset `before`, oldest first,
+    with all columns for the archive.
+    """
+    rows = (
+        session.query(Notification)
+        .filter(Notification.delivered.is_(True))
+        .filter(tuple_(Notification.created_utc, Notification.id) < tuple_(*before))
+        .order_by(Notification.created_utc.asc(), Notification.id.asc())
+        .limit(limit)
+        .all()
     )
 
-    for notification in notifications:
-        notification.delivered = True
+    return [
+        {
+            "id": row.id,
+            "type": row.type,
+            "author": row.author,
+            "content": row.content,
+            "url": row.url,
+            "created_utc": row.created_utc,
+        }
+        for row in rows
+    ]
+
+
+def delete_notifications(session: Session, notification_ids: list[str]) -> int:
+    """
+    Deletes notifications by id in chunks, in one transaction. Returns the number deleted.
+    """
+    ids = list(notification_ids)
+    deleted = 0
+
+    for start in range(0, len(ids), IN_CHUNK_SIZE):
+        result = session.execute(
+            delete(Notification)
+            .where(Notification.id.in_(ids[start : start + IN_CHUNK_SIZE]))
+            .execution_options(synchronize_session=False)
+        )
+        deleted += result.rowcount
+
+    safe_commit(session)
+
+    return deleted
+
+
+"""STREAM CHECKPOINTS"""
+
+
+def get_stream_checkpoints(session: Session) -> dict[str, tuple[str, float]]:
+    """
+    Gets the newest processed item of every stream as {stream: (fullname, created_utc)}
+    """
+    return {
+        row.stream: (row.fullname, row.created_utc)
+        for row in session.query(StreamCheckpoint).all()
+    }
+
+
+def set_stream_checkpoints(
+    session: Session, checkpoints: dict[str, tuple[str, float]]
+) -> None:
+    """
+    Stores the newest processed item of the given streams
+    """
+    if not checkpoints:
+        return
+
+    rows = [
+        {"stream": stream, "fullname": fullname, "created_utc": created_utc}
+        for stream, (fullname, created_utc) in checkpoints.items()
+    ]
+    stmt = sqlite_insert(StreamCheckpoint).values(rows)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[StreamCheckpoint.stream],
+        set_={
+            "fullname": stmt.excluded.fullname,
+            "created_utc": stmt.excluded.created_utc,
+        },
+    )
+    session.execute(stmt)
     safe_commit(session)
 
     return
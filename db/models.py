@@ -1,4 +1,4 @@
-from sqlalchemy import Boolean, Float, Integer, String
+from sqlalchemy import Boolean, Float, Index, Integer, String, func
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
 
 """MODELS"""
@@ -14,7 +14,7 @@ class WatchedSubreddit(Base):
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     name: Mapped[str] = mapped_column(String, unique=True)
-    active: Mapped[bool] = mapped_column(Boolean, default=True)
+    active: Mapped[bool] = mapped_column(Boolean, default=True, index=True)
 
 
 class WatchedRedditor(Base):
@@ -22,13 +22,21 @@ class WatchedRedditor(Base):
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     username: Mapped[str] = mapped_column(String, unique=True)
-    active: Mapped[bool] = mapped_column(Boolean, default=True)
+    active: Mapped[bool] = mapped_column(Boolean, default=True, index=True)
     muted_until: Mapped[float] = mapped_column(Float, default=0)
     rating: Mapped[int] = mapped_column(Integer, default=5)
 
 
+# Rating lookup of the pending poll: WHERE lower(username) = lower(notifications.author)
+Index("ix_watched_users_username_lower", func.lower(WatchedRedditor.username))
+
+
 class Notification(Base):
     __tablename__ = "notifications"
+    __table_args__ = (
+        # Pending poll: WHERE delivered = 0 ORDER BY created_utc, id breaks ties
+        Index("ix_notifications_pending", "delivered", "created_utc", "id"),
+    )
 
     id: Mapped[str] = mapped_column(String, primary_key=True)
     type: Mapped[str] = mapped_column(String)
@@ -45,4 +53,12 @@ class TelegramUser(Base):
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     chat_id: Mapped[str] = mapped_column(String, unique=True)
     username: Mapped[str] = mapped_column(String, nullable=True)
-    active: Mapped[bool] = mapped_column(Boolean, default=True)
+    active: Mapped[bool] = mapped_column(Boolean, default=True, index=True)
+
+
+class StreamCheckpoint(Base):
+    __tablename__ = "stream_checkpoints"
+
+    stream: Mapped[str] = mapped_column(String, primary_key=True)
+    fullname: Mapped[str] = mapped_column(String)
+    created_utc: Mapped[float] = mapped_column(Float)
@@ -0,0 +1,142 @@
+import gzip
+import json
+import logging
+import os
+import time
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Callable
+
+from sqlalchemy import Engine
+from sqlalchemy.orm import Session
+
+from .crud import delete_notifications, get_expired_notifications, get_retention_boundary
+
+logger = logging.getLogger("reddit_watcher." + __name__)
+
+# Free pages returned to the file system per incremental vacuum step, other writers get the
+# lock in between
+VACUUM_STEP_PAGES = 1000
+
+
+@dataclass(frozen=True)
+class RetentionPolicy:
+    """
+    Which delivered notifications expire and where they are archived. 0 disables a limit.
+    """
+
+    max_age_days: float = 30
+    max_rows: int = 0
+    archive_dir: str = "archive"
+    batch_size: int = 500
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.max_age_days or self.max_rows)
+
+
+def archive_path(archive_dir: str, created_utc: float) -> str:
+    day = datetime.fromtimestamp(created_utc, tz=timezone.utc).date().isoformat()
+    return os.path.join(archive_dir, f"notifications-{day}.jsonl.gz")
+
+
+def archive_notifications(rows: list[dict], archive_dir: str) -> None:
+    """
+    Appends the rows as JSON lines to one gzip file per UTC day of `created_utc`.
+
+    Every append is a new gzip member, which gzip readers read as one stream. The files are
+    synced before returning, the rows may then be deleted from the DB.
+    """
+    os.makedirs(archive_dir, exist_ok=True)
+    partitions: dict[str, list[dict]] = defaultdict(list)
+
+    for row in rows:
+        partitions[archive_path(archive_dir, row["created_utc"])].append(row)
+
+    for path, partition in partitions.items():
+        with open(path, "ab") as raw:
+            with gzip.GzipFile(fileobj=raw, mode="ab") as archive:
+                for row in partition:
+                    archive.write(json.dumps(row, ensure_ascii=False).encode() + b"\n")
+
+            raw.flush()
+            os.fsync(raw.fileno())
+
+
+def incremental_vacuum(db_engine: Engine, step_pages: int = VACUUM_STEP_PAGES) -> int:
+    """
+    Returns free pages to the file system in small steps. Returns the number of pages freed.
+    Does nothing unless the file uses auto_vacuum=INCREMENTAL, see `enable_incremental_vacuum`.
+    """
+    freed = 0
+
+    with db_engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        while True:
+            free = conn.exec_driver_sql("PRAGMA freelist_count").scalar() or 0
+
+            if not free:
+                return freed
+
+            conn.exec_driver_sql(f"PRAGMA incremental_vacuum({step_pages})")
+            left = conn.exec_driver_sql("PRAGMA freelist_count").scalar() or 0
+
+            # auto_vacuum is off, the pages stay in the file
+            if left >= free:
+                return freed
+
+            freed += free - left
+
+
+def apply_retention(
+    session_factory: Callable[[], Session],
+    db_engine: Engine,
+    policy: RetentionPolicy,
+    now: float | None = None,
+) -> dict:
+    """
+    Archives and deletes expired notifications batch by batch, then compacts the file.
+
+    Each batch is archived before it is deleted, a crash in between archives it again on the
+    next run. Archive readers should treat the id as unique.
+    """
+    stats = {"archived": 0, "batches": 0, "pages_freed": 0}
+
+    if not policy.enabled:
+        return stats
+
+    now = time.time() if now is None else now
+    cutoff = now - policy.max_age_days * 86400 if policy.max_age_days else None
+
+    session = session_factory()
+
+    try:
+        boundary = get_retention_boundary(session, cutoff, policy.max_rows)
+
+    finally:
+        session.close()
+
+    if boundary is None:
+        return stats
+
+    while True:
+        session = session_factory()
+
+        try:
+            rows = get_expired_notifications(session, boundary, policy.batch_size)
+
+            if not rows:
+                break
+
+            archive_notifications(rows, policy.archive_dir)
+            stats["archived"] += delete_notifications(session, [row["id"] for row in rows])
+            stats["batches"] += 1
+
+        finally:
+            session.close()
+
+    if stats["archived"]:
+        stats["pages_freed"] = incremental_vacuum(db_engine)
+        logger.info(f"[DB] Retention: {stats}")
+
+    return stats
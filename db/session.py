@@ -1,15 +1,144 @@
-from sqlalchemy import create_engine
+import logging
+import os
+import shutil
+
+from sqlalchemy import Engine, create_engine, event
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.schema import CreateIndex
 
-from config.config import DB_URL
+from config.config import DB_PROFILE, DB_URL
 from db.models import Base
 
-engine = create_engine(DB_URL, echo=False)
+logger = logging.getLogger("reddit_watcher." + __name__)
+
+"""
+SQLite engine profiles. Each profile is a set of PRAGMAs applied to every new connection.
+
+"performance" lets the watcher and the Telegram bot write to the same file without blocking
+readers: WAL journaling, fsync only at checkpoints, and a busy timeout so SQLite waits for the
+lock instead of failing with "database is locked".
+"""
+SQLITE_PROFILES: dict[str, dict[str, str | int]] = {
+    "default": {},
+    "performance": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "busy_timeout": 5000,
+        "mmap_size": 256 * 1024 * 1024,
+        "cache_size": -64 * 1024,
+    },
+}
+
+
+def apply_sqlite_profile(engine: Engine, profile: str) -> None:
+    """
+    Registers a connect listener that applies the PRAGMAs of `profile` to every new connection.
+    """
+    if profile not in SQLITE_PROFILES:
+        raise ValueError(f"Unknown SQLite profile: {profile}")
+
+    pragmas = SQLITE_PROFILES[profile]
+
+    if not pragmas:
+        return
+
+    @event.listens_for(engine, "connect")
+    def set_sqlite_pragmas(dbapi_connection, _connection_record):
+        cursor = dbapi_connection.cursor()
+
+        try:
+            for name, value in pragmas.items():
+                cursor.execute(f"PRAGMA {name}={value}")
+
+        finally:
+            cursor.close()
+
+
+def create_db_engine(url: str = DB_URL, profile: str = DB_PROFILE) -> Engine:
+    """
+    Create an engine for `url` and apply the SQLite profile if it is a SQLite URL.
+    """
+    db_engine = create_engine(url, echo=False)
+
+    if db_engine.dialect.name == "sqlite":
+        apply_sqlite_profile(db_engine, profile)
+
+    return db_engine
+
+
+engine = create_db_engine()
 SessionLocal = sessionmaker(bind=engine)
 
 
+def create_missing_indexes(db_engine: Engine) -> None:
+    """
+    Creates indexes that were added to the models after the tables were created.
+    `create_all` skips existing tables and with them their new indexes.
+
+    IF NOT EXISTS instead of `checkfirst`, reflection does not see expression indexes.
+    """
+    with db_engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            for index in table.indexes:
+                conn.execute(CreateIndex(index, if_not_exists=True))
+
+
+def enable_incremental_vacuum(db_engine: Engine, vacuum: bool = False) -> bool:
+    """
+    Switches a SQLite file to auto_vacuum=INCREMENTAL, so the retention job can hand free pages
+    back to the file system. Returns True if the file uses it afterwards.
+
+    A new file without tables switches right away. An existing file needs one full VACUUM, which
+    rewrites it under an exclusive lock and needs up to twice its size in free disk space. That
+    only runs with `vacuum`, see `python main.py --enable-incremental-vacuum`.
+    """
+    if db_engine.dialect.name != "sqlite":
+        return False
+
+    with db_engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        # 0 = NONE, 1 = FULL, 2 = INCREMENTAL
+        if conn.exec_driver_sql("PRAGMA auto_vacuum").scalar() == 2:
+            return True
+
+        tables = conn.exec_driver_sql("SELECT count(*) FROM sqlite_master").scalar()
+
+        if not tables:
+            # WAL mode already wrote the header, the VACUUM of an empty file is instant
+            conn.exec_driver_sql("PRAGMA auto_vacuum=INCREMENTAL")
+            conn.exec_driver_sql("VACUUM")
+            return True
+
+        if not vacuum:
+            logger.warning(
+                "[DB] Incremental vacuum is off, retention cannot shrink the file. "
+                "Run `python main.py --enable-incremental-vacuum` once to switch it on"
+            )
+            return False
+
+        path = db_engine.url.database
+
+        if path and path != ":memory:":
+            size = os.path.getsize(path)
+            free = shutil.disk_usage(os.path.dirname(os.path.abspath(path))).free
+
+            if free < 2 * size:
+                logger.error(
+                    f"[DB] VACUUM needs up to {2 * size} bytes free, only {free} available"
+                )
+                return False
+
+        logger.info("[DB] Enabling incremental vacuum, running a one-time VACUUM")
+        conn.exec_driver_sql("PRAGMA auto_vacuum=INCREMENTAL")
+        conn.exec_driver_sql("VACUUM")
+
+        return True
+
+
 def init_db():
     """
-    Function to initiate the DB if it doesnt exist. Only needs to be called once. If DB exists it doesnt do anything
+    Function to initiate the DB if it doesnt exist. Only needs to be called once. If DB exists it only adds missing indexes
     """
+    # Before the tables, a new file gets incremental vacuum without a VACUUM
+    enable_incremental_vacuum(engine)
     Base.metadata.create_all(engine)
+    create_missing_indexes(engine)
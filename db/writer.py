@@ -0,0 +1,108 @@
+import logging
+import threading
+import time
+from typing import Callable
+
+from sqlalchemy.orm import Session
+
+from .cache import SeenIdCache
+from .crud import add_notifications_to_db, row_fullname
+
+logger = logging.getLogger("reddit_watcher." + __name__)
+
+
+class NotificationWriter:
+    """
+    Buffers notification rows and writes them in one transaction per batch.
+
+    A batch is flushed once it holds `max_batch` rows or its oldest row is `max_delay` seconds old.
+    Call `flush_if_due` regularly so a quiet stream still gets its rows written, and `close` on
+    shutdown. `on_flush` is called with the newly inserted rows after each committed batch.
+    With a `seen` cache, rows whose item was already stored are dropped before the DB.
+    """
+
+    def __init__(
+        self,
+        session_factory: Callable[[], Session],
+        max_batch: int = 50,
+        max_delay: float = 1.0,
+        on_flush: Callable[[list[dict]], None] | None = None,
+        seen: SeenIdCache | None = None,
+    ) -> None:
+        self._session_factory = session_factory
+        self.on_flush = on_flush
+        self.seen = seen
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self._lock = threading.Lock()
+        self._rows: list[dict] = []
+        self._oldest: float = 0
+
+    def add(self, row: dict) -> None:
+        if self.seen is not None and self.seen.check_and_add(row_fullname(row)):
+            return
+
+        with self._lock:
+            if not self._rows:
+                self._oldest = time.monotonic()
+            self._rows.append(row)
+
+        if self.pending >= self.max_batch:
+            self.flush()
+
+    @property
+    def pending(self) -> int:
+        return len(self._rows)
+
+    def is_due(self) -> bool:
+        return bool(self._rows) and time.monotonic() - self._oldest >= self.max_delay
+
+    def flush_if_due(self) -> int:
+        if self.is_due():
+            return self.flush()
+
+        return 0
+
+    def flush(self) -> int:
+        """
+        Write all buffered rows. Returns the number of rows written.
+        """
+        with self._lock:
+            rows, self._rows = self._rows, []
+
+        if not rows:
+            return 0
+
+        session = self._session_factory()
+
+        try:
+            inserted = set(add_notifications_to_db(session, rows))
+
+        except Exception:
+            # Put the rows back so the next flush retries them
+            with self._lock:
+                self._rows = rows + self._rows
+            raise
+
+        finally:
+            session.close()
+
+        logger.debug(f"[DB] Flushed {len(rows)} notifications")
+
+        new_rows = [row for row in rows if row["id"] in inserted]
+
+        if self.on_flush and new_rows:
+            try:
+                self.on_flush(new_rows)
+
+            except Exception:
+                logger.exception("[DB] on_flush callback failed")
+
+        return len(rows)
+
+    def close(self) -> None:
+        try:
+            self.flush()
+
+        except Exception:
+            logger.exception("[DB] Failed to flush notifications on shutdown")
@@ -0,0 +1,101 @@
+import asyncio
+import logging
+import os
+import socket
+
+"""
+Wakeup channel between the Reddit watcher and the Telegram sender.
+
+The watcher sends an empty datagram to a Unix socket after it committed new notifications.
+The sender listens on that socket and starts delivering right away instead of waiting for its
+next poll. The datagram carries no data, SQLite stays the source of truth. If nobody listens the
+datagram is dropped and the sender keeps polling.
+"""
+
+logger = logging.getLogger("reddit_watcher." + __name__)
+
+
+def send_wakeup(path: str) -> bool:
+    """
+    Signal the listener at `path`. Returns False if nobody is listening.
+    """
+    if not path:
+        return False
+
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM) as sock:
+            sock.setblocking(False)
+            sock.sendto(b"\0", path)
+
+    except OSError:
+        return False
+
+    return True
+
+
+class WakeupListener:
+    """
+    Listens for wakeup datagrams inside the running asyncio loop.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._event = asyncio.Event()
+        self._sock: socket.socket | None = None
+
+    def open(self) -> None:
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        sock.setblocking(False)
+        sock.bind(self.path)
+
+        asyncio.get_running_loop().add_reader(sock.fileno(), self._on_readable)
+        self._sock = sock
+
+    def _on_readable(self) -> None:
+        assert self._sock
+
+        try:
+            while self._sock.recv(64):
+                pass
+
+        except BlockingIOError:
+            pass
+
+        except OSError:
+            logger.exception("[IPC] Wakeup socket failed, falling back to polling")
+            self.close()
+
+        self._event.set()
+
+    async def wait(self, timeout: float) -> bool:
+        """
+        Wait for a wakeup or until `timeout` passed. Returns True if woken up.
+        """
+        try:
+            await asyncio.wait_for(self._event.wait(), timeout)
+            return True
+
+        except asyncio.TimeoutError:
+            return False
+
+        finally:
+            self._event.clear()
+
+    def close(self) -> None:
+        if self._sock is None:
+            return
+
+        try:
+            asyncio.get_running_loop().remove_reader(self._sock.fileno())
+
+        except RuntimeError:
+            pass
+
+        self._sock.close()
+        self._sock = None
+
+        if os.path.exists(self.path):
+            os.unlink(self.path)
@@ -1,14 +1,18 @@
+import argparse
+import asyncio
 import logging
 import os
 import signal
 import subprocess
 import sys
+import tempfile
+import threading
 import time
 import types
 from logging.handlers import RotatingFileHandler
 from typing import Optional
 
-from db.session import init_db  # ensure db creation
+from db.session import engine, enable_incremental_vacuum, init_db  # ensure db creation
 
 logger = logging.getLogger("reddit_watcher")
 
@@ -34,7 +38,9 @@ logger.addHandler(rotating_file_handler)
 # -------------------------
 # Start subprocess helper
 # -------------------------
-def start_subprocess(module: str) -> Optional[subprocess.Popen]:
+def start_subprocess(
+    module: str, extra_env: Optional[dict[str, str]] = None
+) -> Optional[subprocess.Popen]:
     """
     Start a Python module as a subprocess, ensuring the project root is in cwd.
     """
@@ -43,7 +49,7 @@ def start_subprocess(module: str) -> Optional[subprocess.Popen]:
         return subprocess.Popen(
             [sys.executable, "-m", module],
             cwd=project_root,
-            env={**os.environ, "PYTHONPATH": project_root},
+            env={**os.environ, "PYTHONPATH": project_root, **(extra_env or {})},
         )
     except Exception as e:
         logger.error(f"Failed to start module {module}: {e}")
@@ -82,17 +88,115 @@ def handle_exit(
     sys.exit(0)
 
 
+# -------------------------
+# Single process mode
+# -------------------------
+def run_single_process() -> None:
+    """
+    Run the Telegram bot and the Reddit watcher in one process. The watcher runs in a worker
+    thread and hands new notifications to the sender through an asyncio.Queue, SQLite is only
+    used for persistence.
+    """
+    from reddit_bot.reddit_client import watch_loop
+    from reddit_bot.reddit_service import set_notification_listener
+    from telegram_bot.handlers import (
+        build_application,
+        run_retention_job,
+        send_queued_notifications,
+    )
+
+    stop_event = threading.Event()
+    tasks: dict[str, asyncio.Task] = {}
+
+    async def on_startup(app) -> None:
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue[list[dict]] = asyncio.Queue()
+
+        set_notification_listener(
+            lambda rows: loop.call_soon_threadsafe(queue.put_nowait, rows)
+        )
+
+        tasks["sender"] = asyncio.create_task(send_queued_notifications(app.bot, queue))
+        tasks["retention"] = asyncio.create_task(run_retention_job())
+        tasks["watcher"] = asyncio.create_task(asyncio.to_thread(watch_loop, stop_event))
+        tasks["watcher"].add_done_callback(lambda task: on_watcher_exit(app, task))
+
+    def on_watcher_exit(app, task: asyncio.Task) -> None:
+        """
+        Stops the bot if the watcher thread died, it would keep running without ingesting.
+        """
+        if task.cancelled():
+            return
+
+        error = task.exception()
+
+        if error:
+            logger.error("Watcher thread crashed", exc_info=error)
+
+        if not stop_event.is_set():
+            logger.error("Watcher thread stopped unexpectedly, stopping the bot")
+            app.stop_running()
+
+    async def on_shutdown(app) -> None:
+        logger.info("Stopping watcher thread...")
+        stop_event.set()
+
+        # The watcher flushes its last batch before the thread returns. A crash was already
+        # logged by on_watcher_exit.
+        await asyncio.gather(tasks["watcher"], return_exceptions=True)
+
+        for name in ("sender", "retention"):
+            tasks[name].cancel()
+
+        await asyncio.gather(tasks["sender"], tasks["retention"], return_exceptions=True)
+
+    app = build_application()
+    app.post_init = on_startup
+    app.post_shutdown = on_shutdown
+
+    logger.info("Bot and watcher started in a single process. Press Ctrl+C to stop.")
+    app.run_polling()
+
+
 # -------------------------
 # Main
 # -------------------------
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Reddit watcher with Telegram bot")
+    parser.add_argument(
+        "--single-process",
+        action="store_true",
+        help="run the Telegram bot and the Reddit watcher in one process",
+    )
+    parser.add_argument(
+        "--enable-incremental-vacuum",
+        action="store_true",
+        help="switch an existing database to incremental vacuum with a one-time VACUUM "
+        "and exit. Stop the bot first, it needs up to twice the file size in free space",
+    )
+    args = parser.parse_args()
+
     # Ensure database exists
     init_db()
 
+    if args.enable_incremental_vacuum:
+        sys.exit(0 if enable_incremental_vacuum(engine, vacuum=True) else 1)
+
+    if args.single_process:
+        run_single_process()
+        sys.exit(0)
+
+    # Socket the watcher uses to wake up the telegram sender on new notifications
+    notify_env = {
+        "REDDIT_WATCHER_NOTIFY_SOCKET": os.path.join(
+            tempfile.gettempdir(), f"reddit_watcher_{os.getpid()}.sock"
+        )
+    }
+
     # Start both scripts as modules
-    telegram_process = start_subprocess("telegram_bot.handlers")
+    telegram_process = start_subprocess("telegram_bot.handlers", notify_env)
     time.sleep(2)  # give telegram bot a moment to start
-    reddit_process = start_subprocess("reddit_bot.reddit_client")
+    reddit_process = start_subprocess("reddit_bot.reddit_client", notify_env)
 
     processes: list[Optional[subprocess.Popen]] = [telegram_process, reddit_process]
 
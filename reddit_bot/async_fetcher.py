@@ -0,0 +1,165 @@
+import asyncio
+import importlib.util
+import logging
+import time
+from types import SimpleNamespace
+from typing import Any
+
+import httpx
+
+from reddit_bot.budget import STREAM, reddit_budget
+from reddit_bot.raw_listings import ListingItem, parse_listing
+
+logger = logging.getLogger("reddit_watcher." + __name__)
+
+HTTPX = "httpx"
+
+TOKEN_URL = "https://www.reddit.com/api/v1/access_token"
+OAUTH_URL = "https://oauth.reddit.com"
+
+# Seconds before expiry at which the access token is renewed
+TOKEN_REFRESH_MARGIN = 60
+
+
+def http2_available() -> bool:
+    """
+    httpx only speaks HTTP/2 with the optional h2 package installed.
+    """
+    return importlib.util.find_spec("h2") is not None
+
+
+class AsyncRedditClient:
+    """
+    Minimal application-only Reddit client on a pooled httpx.AsyncClient.
+
+    Gets an access token with the client credentials grant, renews it shortly before it expires
+    or when Reddit answers 401, and reuses the connections for every request. The rate limit
+    headers are kept in `auth.limits` like praw does, so the client can join the request budget.
+    """
+
+    def __init__(
+        self,
+        client_id: str,
+        client_secret: str,
+        user_agent: str,
+        pool_size: int = 10,
+        timeout: float = 16.0,
+        transport: httpx.AsyncBaseTransport | None = None,
+    ) -> None:
+        self._credentials = (client_id, client_secret)
+        self._token: str | None = None
+        self._token_expires = 0.0
+        self._token_lock = asyncio.Lock()
+        self.auth = SimpleNamespace(
+            limits={"remaining": None, "reset_timestamp": None, "used": None}
+        )
+        self._http = httpx.AsyncClient(
+            base_url=OAUTH_URL,
+            headers={"User-Agent": user_agent},
+            http2=http2_available(),
+            limits=httpx.Limits(
+                max_connections=pool_size, max_keepalive_connections=pool_size
+            ),
+            timeout=timeout,
+            transport=transport,
+        )
+
+    async def _access_token(self, stale: str | None = None) -> str:
+        """
+        Returns a valid token. `stale` is a token Reddit rejected, it is renewed once even if
+        several requests saw it fail.
+        """
+        async with self._token_lock:
+            expired = time.time() >= self._token_expires - TOKEN_REFRESH_MARGIN
+
+            if self._token and not expired and self._token != stale:
+                return self._token
+
+            response = await self._http.post(
+                TOKEN_URL,
+                auth=self._credentials,
+                data={"grant_type": "client_credentials"},
+            )
+            response.raise_for_status()
+            payload = response.json()
+
+            self._token = payload["access_token"]
+            self._token_expires = time.time() + payload.get("expires_in", 3600)
+            logger.debug("[Async] Renewed access token")
+
+            return self._token
+
+    def _record_limits(self, headers: httpx.Headers) -> None:
+        remaining = headers.get("x-ratelimit-remaining")
+        reset = headers.get("x-ratelimit-reset")
+
+        if remaining is None or reset is None:
+            return
+
+        self.auth.limits.update(
+            remaining=float(remaining),
+            reset_timestamp=time.time() + float(reset),
+            used=int(float(headers.get("x-ratelimit-used", 0))),
+        )
+
+    async def get(self, path: str, params: dict[str, Any] | None = None) -> Any:
+        """
+        GETs an API path and returns the decoded JSON. Raises httpx.HTTPStatusError on errors.
+        """
+        stale = None
+
+        for attempt in range(2):
+            token = await self._access_token(stale)
+            response = await self._http.get(
+                path, params=params, headers={"Authorization": f"bearer {token}"}
+            )
+            self._record_limits(response.headers)
+
+            if response.status_code == 401 and attempt == 0:
+                stale = token
+                continue
+
+            response.raise_for_status()
+            return response.json()
+
+    async def listing(self, path: str, limit: int) -> list[ListingItem]:
+        await reddit_budget.acquire_async(STREAM)
+        return parse_listing(await self.get(path, {"limit": limit, "raw_json": 1}))
+
+    async def aclose(self) -> None:
+        await self._http.aclose()
+
+
+class AsyncListingFetcher:
+    """
+    Fetches many listings at once for the synchronous watcher.
+
+    Owns an event loop that lives as long as the fetcher, so the pooled connections and the
+    access token survive between polls.
+    """
+
+    def __init__(self, client: AsyncRedditClient) -> None:
+        self.client = client
+        self._runner = asyncio.Runner()
+        reddit_budget.register(client)
+
+    def fetch_all(
+        self, paths: list[str], limit: int
+    ) -> list[list[ListingItem] | BaseException]:
+        """
+        Fetches all listing paths concurrently. A failed fetch gives its exception instead of
+        items, so one bad listing does not discard the others.
+        """
+        return self._runner.run(self._fetch_all(paths, limit))
+
+    async def _fetch_all(
+        self, paths: list[str], limit: int
+    ) -> list[list[ListingItem] | BaseException]:
+        return await asyncio.gather(
+            *(self.client.listing(path, limit) for path in paths),
+            return_exceptions=True,
+        )
+
+    def close(self) -> None:
+        self._runner.run(self.client.aclose())
+        self._runner.close()
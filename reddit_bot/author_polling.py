@@ -0,0 +1,244 @@
+import heapq
+import logging
+import time
+from typing import Any, Iterable
+
+import praw
+from praw.models.util import BoundedSet
+from prawcore.exceptions import Forbidden, NotFound
+
+from reddit_bot.budget import AUTHORS as AUTHORS_PRIORITY
+from reddit_bot.budget import reddit_budget
+from reddit_bot.raw_listings import PRAW, RAW, fetch_user_listing
+from reddit_bot.streams import LISTING_LIMIT
+
+logger = logging.getLogger("reddit_watcher." + __name__)
+
+# Items fetched per author listing. Watched redditors rarely post more between two polls
+AUTHOR_LISTING_LIMIT = 25
+
+FIREHOSE = "firehose"
+AUTHORS = "authors"
+
+
+class AuthorScheduler:
+    """
+    Decides which watched redditor is polled next.
+
+    Every author has a next due time in a min-heap. Authors that posted in recent polls are
+    polled more often, quiet ones back off towards `max_interval`.
+    """
+
+    def __init__(self, min_interval: float, max_interval: float, alpha: float = 0.3):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.alpha = alpha
+        self._heap: list[tuple[float, str]] = []
+        self._due: dict[str, float] = {}
+        self._activity: dict[str, float] = {}
+
+    def set_authors(self, authors: Iterable[str]) -> None:
+        """
+        Schedules new authors right away and forgets removed ones.
+        """
+        authors = set(authors)
+        now = time.time()
+
+        for name in authors - self._due.keys():
+            self._due[name] = now
+            heapq.heappush(self._heap, (now, name))
+
+        for name in self._due.keys() - authors:
+            del self._due[name]
+            self._activity.pop(name, None)
+
+    def interval(self, author: str) -> float:
+        activity = self._activity.get(author, 0.0)
+        return max(self.min_interval, self.max_interval / (1 + 4 * activity))
+
+    def mean_interval(self) -> float:
+        if not self._due:
+            return self.max_interval
+
+        return sum(self.interval(name) for name in self._due) / len(self._due)
+
+    def next_due(self) -> float:
+        return self._heap[0][0] if self._heap else time.time() + self.min_interval
+
+    def pop_due(self, limit: int, now: float | None = None) -> list[str]:
+        now = time.time() if now is None else now
+        due = []
+
+        while self._heap and self._heap[0][0] <= now and len(due) < limit:
+            when, name = heapq.heappop(self._heap)
+
+            # Removed authors and stale entries of rescheduled ones are skipped
+            if self._due.get(name) == when:
+                due.append(name)
+
+        return due
+
+    def record(self, author: str, new_items: int, now: float | None = None) -> None:
+        """
+        Updates the activity of an author after a poll and schedules the next one.
+        """
+        if author not in self._due:
+            return
+
+        now = time.time() if now is None else now
+        previous = self._activity.get(author, 0.0)
+        self._activity[author] = previous + self.alpha * (new_items - previous)
+
+        when = now + self.interval(author)
+        self._due[author] = when
+        heapq.heappush(self._heap, (when, author))
+
+
+class AuthorPoller:
+    """
+    Fetches the newest comments and submissions of due authors from their user listings.
+
+    Items created at or before `since` are ignored, they were covered by the firehose or an
+    earlier run. Authors added to the watchlist later only get items from the time they were
+    added, like in firehose mode. `covered_until` tells up to when every author was polled.
+    """
+
+    def __init__(
+        self,
+        reddit: praw.Reddit,
+        scheduler: AuthorScheduler,
+        since: float,
+        fetcher: str = PRAW,
+    ) -> None:
+        self.reddit = reddit
+        self.scheduler = scheduler
+        self.since = since
+        self.fetcher = fetcher
+        self._added: dict[str, float] = {}
+        self._polled: dict[str, float] = {}
+        self._known: set[str] | None = None
+        self._seen = BoundedSet(4 * AUTHOR_LISTING_LIMIT * 100)
+
+    def set_authors(self, authors: Iterable[str]) -> None:
+        authors = set(authors)
+        now = time.time()
+
+        if self._known is not None:
+            for name in authors - self._known:
+                self._added[name] = now
+
+        for name in self._added.keys() - authors:
+            del self._added[name]
+
+        for name in self._polled.keys() - authors:
+            del self._polled[name]
+
+        self._known = authors
+        self.scheduler.set_authors(authors)
+
+    def resume_from(self, since: float) -> None:
+        """
+        Restarts per-author polling after a stretch in firehose mode.
+        """
+        self.since = since
+        self._added.clear()
+        self._polled.clear()
+
+    def covered_until(self) -> float:
+        """
+        Time up to which the listings of every author were fetched. Items created later may
+        still turn up in the next poll of an author.
+        """
+        if not self._known:
+            return time.time()
+
+        return min(
+            self._polled.get(name, self._added.get(name, self.since))
+            for name in self._known
+        )
+
+    def _listing(self, author: str, kind: str) -> list[Any]:
+        if self.fetcher == RAW:
+            return fetch_user_listing(self.reddit, kind, author, AUTHOR_LISTING_LIMIT)
+
+        redditor = self.reddit.redditor(author)
+        listing = redditor.comments if kind == "comments" else redditor.submissions
+
+        return list(listing.new(limit=AUTHOR_LISTING_LIMIT))
+
+    def _fetch(self, author: str, kind: str) -> list[Any]:
+        since = self._added.get(author, self.since)
+        new_items = []
+        reddit_budget.acquire(AUTHORS_PRIORITY)
+
+        for item in reversed(self._listing(author, kind)):
+            if item.created_utc <= since or item.fullname in self._seen:
+                continue
+
+            self._seen.add(item.fullname)
+            new_items.append(item)
+
+        return new_items
+
+    def poll(self, limit: int) -> tuple[list[Any], list[Any]]:
+        """
+        Polls up to `limit` due authors. Returns their new comments and submissions.
+        """
+        comments: list[Any] = []
+        submissions: list[Any] = []
+
+        for author in self.scheduler.pop_due(limit):
+            started = time.time()
+
+            try:
+                new_comments = self._fetch(author, "comments")
+                new_submissions = self._fetch(author, "submissions")
+
+            except (Forbidden, NotFound):
+                # Suspended or deleted accounts have nothing to fetch, they count as polled
+                logger.warning(f"Redditor {author} is suspended or deleted")
+                self._polled[author] = started
+                self.scheduler.record(author, 0)
+                continue
+
+            except Exception:
+                # A failing account must not stall the others
+                logger.exception(f"Failed to poll redditor {author}")
+                self.scheduler.record(author, 0)
+                continue
+
+            self._polled[author] = started
+            self.scheduler.record(author, len(new_comments) + len(new_submissions))
+            comments.extend(new_comments)
+            submissions.extend(new_submissions)
+
+        return comments, submissions
+
+
+def choose_ingestion_mode(
+    current: str,
+    author_count: int,
+    items_per_poll: float,
+    shard_count: int,
+    poll_interval: float,
+    author_interval: float,
+) -> str:
+    """
+    Picks firehose or per-author ingestion by the estimated API calls per minute.
+
+    The firehose needs two listings per shard and poll, more if the subreddits produce more
+    than one listing of items per poll. Per-author mode needs two listings per author and
+    author interval. A 2x margin keeps the mode from flapping around the break-even point.
+    """
+    polls_per_minute = 60 / poll_interval
+    listings_per_poll = max(shard_count, items_per_poll / LISTING_LIMIT)
+    firehose_calls = 2 * listings_per_poll * polls_per_minute
+    author_calls = 2 * author_count * 60 / author_interval
+
+    if current == FIREHOSE and author_calls * 2 < firehose_calls:
+        return AUTHORS
+
+    if current == AUTHORS and author_calls > firehose_calls * 2:
+        return FIREHOSE
+
+    return current
@@ -0,0 +1,161 @@
+import asyncio
+import logging
+import threading
+import time
+import weakref
+from typing import Any, Callable
+
+logger = logging.getLogger("reddit_watcher." + __name__)
+
+"""
+Request priorities, highest first. Validations answer a Telegram user right now, the streams
+are the watcher's main work, per-author polling runs in the background.
+"""
+VALIDATION = "validation"
+STREAM = "stream"
+AUTHORS = "authors"
+
+# Share of the remaining requests of a rate limit window each priority may spend. The shares
+# partition the window, together they never spend more than Reddit allows.
+DEFAULT_SHARES = {VALIDATION: 0.2, STREAM: 0.5, AUTHORS: 0.3}
+
+# Priorities that may spend their share right away instead of spreading it over the window.
+# A Telegram user adding a watchlist waits on every lookup, the loops do not.
+BURST_PRIORITIES = frozenset({VALIDATION})
+
+
+class RequestBudget:
+    """
+    Paces Reddit API requests from the rate limit headers praw records in `reddit.auth.limits`.
+
+    Paced priorities spread their share of the remaining requests evenly over the time left
+    until the window resets, so the watcher slows down before Reddit answers with 429 instead of
+    after. Requests of one paced priority are spaced by a reserved time slot, which keeps
+    threads from bursting together. Burst priorities spend their share of the window as fast
+    as they like and only wait for the next window once it is used up.
+    The shares sum to at most 1, so all priorities running at once stay within the window.
+    A small safety margin of requests is never spent.
+    """
+
+    def __init__(
+        self,
+        shares: dict[str, float] | None = None,
+        safety_margin: int = 5,
+        clock: Callable[[], float] = time.time,
+        sleep: Callable[[float], None] = time.sleep,
+        burst: frozenset[str] = BURST_PRIORITIES,
+    ) -> None:
+        self.shares = shares or dict(DEFAULT_SHARES)
+        self.burst = burst
+
+        if sum(self.shares.values()) > 1 + 1e-9:
+            raise ValueError(f"Request shares add up to more than 1: {self.shares}")
+
+        self.safety_margin = safety_margin
+        self._clock = clock
+        self._sleep = sleep
+        self._clients: weakref.WeakSet = weakref.WeakSet()
+        self._next_slot: dict[str, float] = {}
+        # Burst priority -> (window reset, last remaining, share of the window, requests spent)
+        self._bursts: dict[str, tuple[float, float, float, int]] = {}
+        self._lock = threading.Lock()
+
+    def register(self, reddit: Any) -> None:
+        """
+        Adds a client whose rate limit headers feed the budget. Anything with a praw-like
+        `auth.limits` dict works.
+        """
+        self._clients.add(reddit)
+
+    def limits(self) -> tuple[float, float] | None:
+        """
+        Returns (remaining, reset_timestamp) of the most exhausted client, None if unknown.
+        All clients share the same OAuth app, so the lowest remaining count is the current one.
+        """
+        known = []
+
+        for reddit in list(self._clients):
+            limits = reddit.auth.limits
+            remaining = limits.get("remaining")
+            reset = limits.get("reset_timestamp")
+
+            if remaining is not None and reset is not None:
+                known.append((remaining, reset))
+
+        return min(known) if known else None
+
+    def delay(self, priority: str, now: float | None = None) -> float:
+        """
+        Seconds a request of `priority` has to wait, reserving its slot.
+        """
+        now = self._clock() if now is None else now
+        limits = self.limits()
+
+        if limits is None:
+            return 0.0
+
+        remaining, reset = limits
+        window_left = reset - now
+
+        if window_left <= 0:
+            return 0.0
+
+        budget = (remaining - self.safety_margin) * self.shares[priority]
+
+        with self._lock:
+            if priority in self.burst:
+                slot = self._burst_slot(priority, now, remaining, reset, budget)
+            elif budget < 1:
+                # Share used up, wait for the next window
+                slot = reset
+                self._next_slot[priority] = reset
+            else:
+                slot = max(now, self._next_slot.get(priority, 0.0))
+                self._next_slot[priority] = slot + window_left / budget
+
+        return max(slot - now, 0.0)
+
+    def _burst_slot(
+        self, priority: str, now: float, remaining: float, reset: float, budget: float
+    ) -> float:
+        window_reset, last_remaining, share, spent = self._bursts.get(
+            priority, (0.0, 0.0, 0.0, 0)
+        )
+
+        # Remaining only goes up when a new window started
+        if now >= window_reset or remaining > last_remaining:
+            window_reset, share, spent = reset, budget, 0
+
+        if budget >= 1 and spent + 1 <= share:
+            slot = now
+            spent += 1
+        else:
+            # Share used up, wait for the next window
+            slot = window_reset
+
+        self._bursts[priority] = (window_reset, remaining, share, spent)
+
+        return slot
+
+    def acquire(self, priority: str) -> None:
+        """
+        Blocks until a request of `priority` fits into the budget.
+        """
+        wait = self.delay(priority)
+
+        if wait > 0:
+            logger.debug(f"[Budget] {priority} request waits {wait:.2f}s")
+            self._sleep(wait)
+
+    async def acquire_async(self, priority: str) -> None:
+        """
+        Like `acquire`, but waits without blocking the event loop.
+        """
+        wait = self.delay(priority)
+
+        if wait > 0:
+            logger.debug(f"[Budget] {priority} request waits {wait:.2f}s")
+            await asyncio.sleep(wait)
+
+
+reddit_budget = RequestBudget()
@@ -0,0 +1,93 @@
+import logging
+import time
+
+logger = logging.getLogger("reddit_watcher." + __name__)
+
+
+class StreamCadence:
+    """
+    Adaptive poll interval of one listing stream.
+
+    Tracks the arrival rate of new items (EWMA, items per second) and the share of each
+    listing that was new. A listing that comes back mostly new means items may have fallen out
+    of the window unseen, so the interval is halved. An empty listing doubles it. Otherwise the
+    interval aims at filling `target_fill` of a listing per poll at the observed rate.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        initial: float,
+        min_interval: float,
+        max_interval: float,
+        listing_size: int = 100,
+        target_fill: float = 0.5,
+        alpha: float = 0.3,
+    ) -> None:
+        self.name = name
+        self.interval = initial
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.listing_size = listing_size
+        self.target_fill = target_fill
+        self.alpha = alpha
+        self.arrival_rate = 0.0
+        self.new_fraction = 0.0
+        self.next_due = 0.0
+        self.failures = 0
+        self._last_poll: float | None = None
+
+    def is_due(self, now: float | None = None) -> bool:
+        now = time.time() if now is None else now
+        return now >= self.next_due
+
+    def record(self, fetched: int, new: int, now: float | None = None) -> None:
+        """
+        Updates the cadence after a poll that returned `fetched` items, `new` of them unseen.
+        """
+        now = time.time() if now is None else now
+        self.failures = 0
+        elapsed = now - self._last_poll if self._last_poll is not None else self.interval
+        self._last_poll = now
+
+        rate = new / max(elapsed, 1e-3)
+        self.arrival_rate += self.alpha * (rate - self.arrival_rate)
+        self.new_fraction = new / fetched if fetched else 0.0
+
+        previous = self.interval
+
+        if new == 0:
+            interval = self.interval * 2
+        elif self.new_fraction >= 0.8:
+            interval = self.interval / 2
+        else:
+            interval = self.target_fill * self.listing_size / self.arrival_rate
+
+        self.interval = min(self.max_interval, max(self.min_interval, interval))
+        self.next_due = now + self.interval
+
+        if abs(self.interval - previous) >= 0.5:
+            logger.debug(
+                f"[Cadence] {self.name}: {previous:.1f}s -> {self.interval:.1f}s "
+                f"(rate {self.arrival_rate:.2f}/s, new {self.new_fraction:.0%})"
+            )
+
+    def back_off(self, now: float | None = None) -> float:
+        """
+        Pushes the next poll out after a failed one, doubling the wait with every failure in a
+        row up to `max_interval`. The interval itself is kept. Returns the wait.
+        """
+        now = time.time() if now is None else now
+        self.failures += 1
+        wait = min(self.max_interval, self.interval * 2**self.failures)
+        self.next_due = now + wait
+
+        return wait
+
+    def report(self) -> dict:
+        return {
+            "stream": self.name,
+            "interval": round(self.interval, 2),
+            "arrival_rate": round(self.arrival_rate, 3),
+            "new_fraction": round(self.new_fraction, 2),
+        }
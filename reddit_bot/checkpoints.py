@@ -0,0 +1,101 @@
+from typing import Protocol
+
+"""STREAM CHECKPOINTS"""
+
+
+class StreamItem(Protocol):
+    id: str
+    created_utc: float
+
+
+def item_position(created_utc: float, item_id: str) -> tuple[float, int]:
+    """
+    Position of an item in a stream. Reddit ids are base36 and grow over time, they break ties
+    between items created in the same second.
+    """
+    return (created_utc, int(item_id, 36))
+
+
+class Checkpoint:
+    """
+    Newest processed item of one stream.
+
+    Only the position the run started from filters items, everything at or before it was
+    handled by an earlier run. Within a run the seen sets of the streams drop repeats, so a
+    late or out-of-order item older than the current position still gets through.
+    A held checkpoint never moves up to the item it is held at, see `hold`.
+    """
+
+    def __init__(self, stream: str, fullname: str | None = None, created_utc: float = 0):
+        self.stream = stream
+        self.fullname = fullname
+        self.created_utc = created_utc
+        self.dirty = False
+        self._position = (
+            item_position(created_utc, fullname.split("_", 1)[-1]) if fullname else None
+        )
+        self._resume = self._position
+        self._hold: tuple[float, int] | None = None
+
+    def is_new(self, item: StreamItem) -> bool:
+        """
+        False for items an earlier run already handled.
+        """
+        if self._resume is None:
+            return True
+
+        return item_position(item.created_utc, item.id) > self._resume
+
+    def advance(self, fullname: str, created_utc: float) -> None:
+        position = item_position(created_utc, fullname.split("_", 1)[-1])
+
+        if self._hold is not None and position >= self._hold:
+            return
+
+        if self._position is None or position > self._position:
+            self._position = position
+            self.fullname = fullname
+            self.created_utc = created_utc
+            self.dirty = True
+
+
+    def hold(self, item: StreamItem) -> None:
+        """
+        Keeps the checkpoint before `item`, which was lost before it was stored. Holds until
+        the process restarts, the next run then replays the stream from before the item.
+        """
+        position = item_position(item.created_utc, item.id)
+
+        if self._hold is None or position < self._hold:
+            self._hold = position
+
+
+class CheckpointStore:
+    """
+    Checkpoints of all streams, loaded once and written back only when they moved.
+    """
+
+    def __init__(self, saved: dict[str, tuple[str, float]]) -> None:
+        self._checkpoints = {
+            stream: Checkpoint(stream, fullname, created_utc)
+            for stream, (fullname, created_utc) in saved.items()
+        }
+
+    def get(self, stream: str) -> Checkpoint:
+        if stream not in self._checkpoints:
+            self._checkpoints[stream] = Checkpoint(stream)
+
+        return self._checkpoints[stream]
+
+    def pop_dirty(self) -> dict[str, tuple[str, float]]:
+        """
+        Returns the checkpoints that moved since the last call and marks them clean.
+        """
+        dirty = {}
+
+        for checkpoint in self._checkpoints.values():
+            if checkpoint.dirty and checkpoint.fullname:
+                dirty[checkpoint.stream] = (checkpoint.fullname, checkpoint.created_utc)
+                checkpoint.dirty = False
+
+        return dirty
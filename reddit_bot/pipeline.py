@@ -0,0 +1,330 @@
+import logging
+import queue
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable
+
+logger = logging.getLogger("reddit_watcher." + __name__)
+
+"""
+Backpressure policies for a full stage queue. "block" makes the producer wait, nothing is lost
+but fetching slows down. "drop_oldest" and "drop_newest" keep the producer going and count the
+items they throw away, the pipeline reports dropped batches to its `on_lost` callback.
+"""
+BLOCK = "block"
+DROP_OLDEST = "drop_oldest"
+DROP_NEWEST = "drop_newest"
+
+_CLOSED = object()
+
+
+@dataclass
+class IngestBatch:
+    """
+    Items of one fetch pass. `watermarks` are the stream checkpoints that are safe to store once
+    every item of this batch and the batches before it was persisted.
+    """
+
+    comments: list[Any]
+    submissions: list[Any]
+    watermarks: dict[str, tuple[str, float]] = field(default_factory=dict)
+
+    def __len__(self) -> int:
+        return len(self.comments) + len(self.submissions)
+
+
+class StageStats:
+    """
+    Counters of one stage: batches and items handled, time spent working and time batches
+    waited in the stage's queue (EWMA and max, milliseconds).
+    """
+
+    def __init__(self, name: str, alpha: float = 0.2) -> None:
+        self.name = name
+        self.alpha = alpha
+        self.batches = 0
+        self.items = 0
+        self.busy_ms = 0.0
+        self.wait_ms = 0.0
+        self.max_wait_ms = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, items: int, busy: float, waited: float = 0.0) -> None:
+        with self._lock:
+            self.batches += 1
+            self.items += items
+            self.busy_ms += self.alpha * (busy * 1000 - self.busy_ms)
+            self.wait_ms += self.alpha * (waited * 1000 - self.wait_ms)
+            self.max_wait_ms = max(self.max_wait_ms, waited * 1000)
+
+    def report(self) -> dict:
+        with self._lock:
+            return {
+                "stage": self.name,
+                "batches": self.batches,
+                "items": self.items,
+                "busy_ms": round(self.busy_ms, 1),
+                "wait_ms": round(self.wait_ms, 1),
+                "max_wait_ms": round(self.max_wait_ms, 1),
+            }
+
+
+class StageQueue:
+    """
+    Bounded queue in front of a stage, applying a backpressure policy when it is full.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        maxsize: int,
+        policy: str = BLOCK,
+        on_drop: Callable[[IngestBatch], None] | None = None,
+    ) -> None:
+        if policy not in (BLOCK, DROP_OLDEST, DROP_NEWEST):
+            raise ValueError(f"Unknown backpressure policy: {policy}")
+
+        self.name = name
+        self.policy = policy
+        self.on_drop = on_drop
+        self.max_depth = 0
+        self.dropped = 0
+        self.blocked_seconds = 0.0
+        self._queue: queue.Queue = queue.Queue(maxsize)
+
+    @property
+    def depth(self) -> int:
+        return self._queue.qsize()
+
+    def put(self, batch: IngestBatch) -> None:
+        entry = (time.monotonic(), batch)
+
+        if self.policy == BLOCK:
+            try:
+                self._queue.put_nowait(entry)
+
+            except queue.Full:
+                started = time.monotonic()
+                self._queue.put(entry)
+                self.blocked_seconds += time.monotonic() - started
+
+        elif self.policy == DROP_NEWEST:
+            try:
+                self._queue.put_nowait(entry)
+
+            except queue.Full:
+                self._drop(batch)
+
+        else:
+            while True:
+                try:
+                    self._queue.put_nowait(entry)
+                    break
+
+                except queue.Full:
+                    try:
+                        _, oldest = self._queue.get_nowait()
+                        self._drop(oldest)
+
+                    except queue.Empty:
+                        pass
+
+        self.max_depth = max(self.max_depth, self.depth)
+
+    def close(self) -> None:
+        """
+        Ends the consumer after everything queued so far. Never drops, even when full.
+        """
+        self._queue.put((time.monotonic(), _CLOSED))
+
+    def get(self, timeout: float) -> tuple[float, Any] | None:
+        """
+        Returns (seconds waited in the queue, batch), None on timeout. The batch is _CLOSED
+        after `close`.
+        """
+        try:
+            enqueued, batch = self._queue.get(timeout=timeout)
+
+        except queue.Empty:
+            return None
+
+        return time.monotonic() - enqueued, batch
+
+    def _drop(self, batch: Any) -> None:
+        if batch is _CLOSED:
+            # Never lose the shutdown marker, put it back behind the new entry
+            self._queue.put_nowait((time.monotonic(), batch))
+            return
+
+        self.dropped += len(batch)
+        logger.warning(f"[Pipeline] {self.name} queue full, dropped {len(batch)} items")
+
+        if self.on_drop:
+            self.on_drop(batch)
+
+    def report(self) -> dict:
+        return {
+            "queue": self.name,
+            "depth": self.depth,
+            "max_depth": self.max_depth,
+            "dropped": self.dropped,
+            "blocked_s": round(self.blocked_seconds, 2),
+        }
+
+
+class Stage:
+    """
+    Worker thread that takes batches from `inbox`, runs `work` on them and hands the result to
+    `outbox`. `idle` runs whenever no batch arrived for `idle_interval` seconds. A batch `work`
+    raised on goes to `on_error`, it does not reach the outbox.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        work: Callable[[IngestBatch], IngestBatch | None],
+        inbox: StageQueue,
+        outbox: StageQueue | None = None,
+        idle: Callable[[], None] | None = None,
+        idle_interval: float = 1.0,
+        on_error: Callable[[IngestBatch], None] | None = None,
+    ) -> None:
+        self.stats = StageStats(name)
+        self.inbox = inbox
+        self._work = work
+        self._outbox = outbox
+        self._idle = idle
+        self._on_error = on_error
+        self._idle_interval = idle_interval
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def join(self, timeout: float | None = None) -> None:
+        self._thread.join(timeout)
+
+    def _run(self) -> None:
+        while True:
+            entry = self.inbox.get(self._idle_interval)
+
+            if entry is None:
+                self._run_idle()
+                continue
+
+            waited, batch = entry
+
+            if batch is _CLOSED:
+                self._run_idle()
+
+                if self._outbox:
+                    self._outbox.close()
+                return
+
+            started = time.monotonic()
+
+            try:
+                result = self._work(batch)
+
+            except Exception:
+                logger.exception(f"[Pipeline] {self.stats.name} failed on a batch")
+                result = None
+                self._report_error(batch)
+
+            self.stats.record(len(batch), time.monotonic() - started, waited)
+
+            if self._outbox and result is not None:
+                self._outbox.put(result)
+
+    def _report_error(self, batch: IngestBatch) -> None:
+        if not self._on_error:
+            return
+
+        try:
+            self._on_error(batch)
+
+        except Exception:
+            logger.exception(f"[Pipeline] {self.stats.name} error callback failed")
+
+    def _run_idle(self) -> None:
+        if not self._idle:
+            return
+
+        try:
+            self._idle()
+
+        except Exception:
+            logger.exception(f"[Pipeline] {self.stats.name} idle task failed")
+
+
+class IngestionPipeline:
+    """
+    Fetch, filter and persist stages connected by bounded queues.
+
+    The caller's thread is the fetch stage and hands each pass to `submit`. Filtering (watchlist,
+    is_author_of_parent, mutes) and persisting (batched writes, then checkpoints) run on their
+    own threads, so a slow commit no longer holds up fetching while the queues have room.
+    `report` shows queue depths, drops, blocked time and per-stage latency, the stage in front
+    of the fullest queue is the bottleneck.
+
+    Batches that are dropped or that a stage fails on go to `on_lost` instead of the next stage.
+    Their watermarks are gone with them, `on_lost` has to keep later batches from moving the
+    checkpoints past the lost items.
+    """
+
+    def __init__(
+        self,
+        filter_batch: Callable[[IngestBatch], IngestBatch | None],
+        persist_batch: Callable[[IngestBatch], None],
+        persist_idle: Callable[[], None] | None = None,
+        queue_size: int = 8,
+        policy: str = BLOCK,
+        on_lost: Callable[[IngestBatch], None] | None = None,
+    ) -> None:
+        self.fetch_stats = StageStats("fetch")
+        self.filter_queue = StageQueue("filter", queue_size, policy, on_drop=on_lost)
+        # Never drop between filter and persist, checkpoints depend on every batch arriving
+        self.persist_queue = StageQueue("persist", queue_size, BLOCK)
+        self.filter_stage = Stage(
+            "ingest-filter",
+            filter_batch,
+            self.filter_queue,
+            self.persist_queue,
+            on_error=on_lost,
+        )
+        self.persist_stage = Stage(
+            "ingest-persist",
+            persist_batch,
+            self.persist_queue,
+            idle=persist_idle,
+            on_error=on_lost,
+        )
+
+    def start(self) -> None:
+        self.filter_stage.start()
+        self.persist_stage.start()
+
+    def submit(self, batch: IngestBatch, fetch_seconds: float) -> None:
+        """
+        Hands over a fetched pass. Blocks or drops by the policy when the filter queue is full.
+        """
+        self.fetch_stats.record(len(batch), fetch_seconds)
+        self.filter_queue.put(batch)
+
+    def close(self, timeout: float | None = 30) -> None:
+        """
+        Lets both stages finish everything already submitted, then stops them.
+        """
+        self.filter_queue.close()
+        self.filter_stage.join(timeout)
+        self.persist_stage.join(timeout)
+
+    def report(self) -> list[dict]:
+        return [
+            self.fetch_stats.report(),
+            self.filter_queue.report(),
+            self.filter_stage.stats.report(),
+            self.persist_queue.report(),
+            self.persist_stage.stats.report(),
+        ]
@@ -0,0 +1,79 @@
+from typing import Any
+
+import praw
+
+"""
+Reddit listings read as plain JSON instead of praw models. Only the fields the watcher uses are
+kept, in a slotted record that the handlers, streams and row builders accept in place of a
+praw Comment or Submission.
+"""
+
+PRAW = "praw"
+RAW = "raw"
+
+# Listing paths of praw.const.API_PATH, without the objector in between
+SUBREDDIT_LISTINGS = {"comments": "r/{}/comments", "submissions": "r/{}/new"}
+USER_LISTINGS = {"comments": "user/{}/comments", "submissions": "user/{}/submitted"}
+
+
+class ListingItem:
+    """
+    Comment or submission of a listing. `author` is the name, None for deleted accounts.
+    """
+
+    __slots__ = (
+        "id",
+        "fullname",
+        "author",
+        "body",
+        "title",
+        "permalink",
+        "created_utc",
+        "is_submitter",
+        "subreddit",
+    )
+
+    def __init__(self, data: dict) -> None:
+        author = data.get("author")
+
+        self.id: str = data["id"]
+        self.fullname: str = data["name"]
+        self.author: str | None = None if author in (None, "[deleted]") else author
+        self.body: str = data.get("body", "")
+        self.title: str = data.get("title", "")
+        self.permalink: str = data["permalink"]
+        self.created_utc: float = data["created_utc"]
+        self.is_submitter: bool = data.get("is_submitter", False)
+        self.subreddit: str = data["subreddit"]
+
+    def __repr__(self) -> str:
+        return f"ListingItem({self.fullname})"
+
+
+def parse_listing(listing: dict) -> list[ListingItem]:
+    """
+    Builds records from a listing response, newest first like praw's listing generators.
+    """
+    return [ListingItem(child["data"]) for child in listing["data"]["children"]]
+
+
+def fetch_listing(reddit: praw.Reddit, path: str, limit: int) -> list[ListingItem]:
+    """
+    GETs a listing through praw's authenticated session, skipping praw's objector.
+    """
+    listing: Any = reddit.request(
+        method="GET", path=path, params={"limit": limit, "raw_json": 1}
+    )
+    return parse_listing(listing)
+
+
+def fetch_subreddit_listing(
+    reddit: praw.Reddit, kind: str, subreddits: str, limit: int
+) -> list[ListingItem]:
+    return fetch_listing(reddit, SUBREDDIT_LISTINGS[kind].format(subreddits), limit)
+
+
+def fetch_user_listing(
+    reddit: praw.Reddit, kind: str, username: str, limit: int
+) -> list[ListingItem]:
+    return fetch_listing(reddit, USER_LISTINGS[kind].format(username), limit)
@@ -1,117 +1,367 @@
+import logging
+import signal
+import sys
+import threading
 import time
-from typing import Generator, cast
+from typing import Any
 
-from praw.models import Comment, Submission
+import httpx
 from prawcore.exceptions import RequestException, ResponseException, ServerError
 
-from config.config import REDDIT_POLL_INTERVAL, WATCHLIST_UPDATE_INTERVAL
+from config.config import (
+    INGEST_BACKPRESSURE,
+    INGEST_QUEUE_SIZE,
+    REDDIT_AUTHOR_MAX_INTERVAL,
+    REDDIT_AUTHOR_MIN_INTERVAL,
+    REDDIT_AUTHORS_PER_PASS,
+    REDDIT_FETCHER,
+    REDDIT_INGESTION_MODE,
+    REDDIT_POLL_INTERVAL,
+    REDDIT_POLL_MAX_INTERVAL,
+    REDDIT_POLL_MIN_INTERVAL,
+    REDDIT_SHARD_COUNT,
+    REDDIT_SHARD_MAX_CHARS,
+    REDDIT_SHARD_REBALANCE_INTERVAL,
+    WATCHLIST_UPDATE_INTERVAL,
+)
 from reddit_bot.reddit_service import (
     add_comment,
     add_submission,
+    flush_notifications,
+    get_async_fetcher,
     get_reddit,
-    get_redditor_list,
-    get_subreddits_string,
+    get_redditor_mute_timers,
+    get_subreddit_list,
     is_author_of_parent,
+    load_checkpoints,
+    load_mute_cache,
     muted,
+    save_checkpoints,
+    seen_cache_report,
+    warm_seen_cache,
+)
+from reddit_bot.author_polling import (
+    AUTHORS,
+    FIREHOSE,
+    AuthorPoller,
+    AuthorScheduler,
+    choose_ingestion_mode,
 )
+from reddit_bot.async_fetcher import HTTPX
+from reddit_bot.checkpoints import Checkpoint, CheckpointStore
+from reddit_bot.pipeline import IngestBatch, IngestionPipeline
+from reddit_bot.raw_listings import RAW
+from reddit_bot.sharding import ShardedStreams
+from reddit_bot.watchlist import WatchlistIndex
 
+logger = logging.getLogger("reddit_watcher." + __name__)
 
-def watch_loop():
-    reddit = get_reddit()
-    last_reload = 0
-    sub_str = ""
-    comment_stream: Generator[Comment | None, None, None] = cast(
-        Generator[Comment | None, None, None], iter([])
-    )
-    submission_stream: Generator[Submission | None, None, None] = cast(
-        Generator[Submission | None, None, None], iter([])
+
+def wants_comment(comment: Any, watchlist: WatchlistIndex) -> bool:
+    """
+    True if the comment is by a watched, unmuted redditor.
+    """
+    author = comment.author
+
+    if not author:
+        print(f"no author {comment.id}")
+        return False
+
+    # A praw Redditor or the plain name of a raw listing item
+    author_name = str(author)
+
+    if not watchlist.is_watched_author(author_name):
+        return False
+
+    if is_author_of_parent(comment):
+        return False
+
+    return not muted(author_name)
+
+
+def wants_submission(submission: Any, watchlist: WatchlistIndex) -> bool:
+    """
+    True if the submission is by a watched, unmuted redditor.
+    """
+    author = submission.author
+
+    if not author:
+        print(f"no author {submission.id}")
+        return False
+
+    author_name = str(author)
+
+    if not watchlist.is_watched_author(author_name):
+        return False
+
+    return not muted(author_name)
+
+
+def filter_batch(batch: IngestBatch, watchlist: WatchlistIndex) -> IngestBatch:
+    """
+    Filter stage: keeps the items that need a notification.
+    """
+    return IngestBatch(
+        [c for c in batch.comments if wants_comment(c, watchlist)],
+        [s for s in batch.submissions if wants_submission(s, watchlist)],
+        batch.watermarks,
     )
-    users = []
-    subs = []
 
-    while True:
+
+def hold_checkpoints(batch: IngestBatch, checkpoints: CheckpointStore) -> None:
+    """
+    Keeps the checkpoints before the items of a batch that was dropped or not written. Later
+    batches then cannot move them past the lost items, and a restart replays from there.
+    """
+    for stream, items in (("comments", batch.comments), ("submissions", batch.submissions)):
+        for item in items:
+            checkpoints.get(stream).hold(item)
+
+    if len(batch):
+        logger.warning(f"[Pipeline] Lost {len(batch)} items, holding their checkpoints")
+
+
+def persist_batch(batch: IngestBatch, checkpoints: CheckpointStore) -> None:
+    """
+    Persist stage: writes the notifications of a pass, then moves the checkpoints past it.
+    If any of them could not be written the checkpoints are held before the pass instead.
+    """
+    failed = False
+
+    for comment in batch.comments:
         try:
-            if time.time() - last_reload > WATCHLIST_UPDATE_INTERVAL:
+            add_comment(comment)
+            print(f"added comment: {comment.author}")
 
-                try:
-                    subs = get_subreddits_string()
-                    users = get_redditor_list()
-                except Exception as e:
-                    continue
+        except Exception:
+            logger.exception(f"Failed to store comment {comment.id}")
+            failed = True
 
-                new_sub_str = subs if subs else "test"
+    for submission in batch.submissions:
+        try:
+            add_submission(submission)
 
-                print(new_sub_str)
+        except Exception:
+            logger.exception(f"Failed to store submission {submission.id}")
+            failed = True
 
-                if new_sub_str != sub_str:
-                    sub_str = new_sub_str
-                    subreddit = reddit.subreddit(sub_str)
+    try:
+        # Write everything of this pass right away, so the sender gets woken up now
+        flush_notifications(force=True)
 
-                    comment_stream: Generator[Comment | None, None, None] = (
-                        subreddit.stream.comments(skip_existing=False, pause_after=-1)
-                    )
-                    submission_stream: Generator[Submission | None, None, None] = (
-                        subreddit.stream.submissions(
-                            skip_existing=False, pause_after=-1
-                        )
-                    )
+    except Exception:
+        logger.exception("Failed to flush notifications")
+        failed = True
 
-                last_reload = time.time()
+    if failed:
+        hold_checkpoints(batch, checkpoints)
+        return
 
-            # process comments
+    # Only after the flush, so a crash never skips notifications that were not written
+    for stream, watermark in batch.watermarks.items():
+        checkpoints.get(stream).advance(*watermark)
 
-            for comment in comment_stream:
-                if comment is None:
-                    time.sleep(1)
-                    break
+    save_checkpoints(checkpoints.pop_dirty())
 
-                author = comment.author
 
-                if not author:
-                    print(f"no author {comment.id}")
-                    continue
+def resume_point(*checkpoints: Checkpoint) -> float:
+    """
+    Time up to which the firehose already processed everything, now if it never ran.
+    """
+    return min((c.created_utc for c in checkpoints if c.fullname), default=time.time())
 
-                author_name = author.name
 
-                if author_name not in users:
-                    continue
+def capped_watermark(
+    watermark: tuple[str, float] | None, items: list[Any], until: float
+) -> tuple[str, float] | None:
+    """
+    Caps a stream watermark at the newest of `items` (oldest first) created at or before
+    `until`. In author mode the firehose checkpoints may not pass the time up to which every
+    author was polled, later items of an author can still turn up in its next poll.
+    """
+    if watermark is None or watermark[1] <= until:
+        return watermark
 
-                if is_author_of_parent(comment):
-                    continue
+    older = [item for item in items if item.created_utc <= until]
 
-                if muted(author_name):
-                    continue
+    return (older[-1].fullname, older[-1].created_utc) if older else None
 
-                add_comment(comment)
-                print(f"added comment: {author}")
 
-            # process submissions similarly...
-            for submission in submission_stream:
-                if submission is None:
-                    time.sleep(1)
-                    break
+def watch_loop(stop_event: threading.Event | None = None):
+    """
+    Watches the subreddits and stores notifications for watched redditors. Runs until
+    `stop_event` is set or the process is interrupted.
+    """
+    stop = stop_event or threading.Event()
+    last_reload = 0
+    last_rebalance = time.time()
+    probe_due = False
+    streams = ShardedStreams(
+        get_reddit,
+        shard_count=REDDIT_SHARD_COUNT,
+        max_chars=REDDIT_SHARD_MAX_CHARS,
+        poll_interval=REDDIT_POLL_INTERVAL,
+        min_interval=REDDIT_POLL_MIN_INTERVAL,
+        max_interval=REDDIT_POLL_MAX_INTERVAL,
+        fetcher=RAW if REDDIT_FETCHER == HTTPX else REDDIT_FETCHER,
+        async_fetcher=get_async_fetcher() if REDDIT_FETCHER == HTTPX else None,
+    )
+    watchlist = WatchlistIndex()
+
+    # Resume after the newest item of the last run instead of replaying the whole listing
+    checkpoints = CheckpointStore(load_checkpoints())
+    comment_checkpoint = checkpoints.get("comments")
+    submission_checkpoint = checkpoints.get("submissions")
+
+    # "auto" starts on the firehose, the planner needs its traffic numbers to decide
+    mode = FIREHOSE if REDDIT_INGESTION_MODE == "auto" else REDDIT_INGESTION_MODE
+    # Items stored shortly before a restart are dropped before they reach the DB
+    warm_seen_cache()
+
+    pipeline = IngestionPipeline(
+        lambda batch: filter_batch(batch, watchlist),
+        lambda batch: persist_batch(batch, checkpoints),
+        persist_idle=flush_notifications,
+        queue_size=INGEST_QUEUE_SIZE,
+        policy=INGEST_BACKPRESSURE,
+        on_lost=lambda batch: hold_checkpoints(batch, checkpoints),
+    )
+    pipeline.start()
+
+    author_poller = AuthorPoller(
+        get_reddit(),
+        AuthorScheduler(REDDIT_AUTHOR_MIN_INTERVAL, REDDIT_AUTHOR_MAX_INTERVAL),
+        since=resume_point(comment_checkpoint, submission_checkpoint),
+        # Author listings are polled one by one, the async client does not help there
+        fetcher=RAW if REDDIT_FETCHER == HTTPX else REDDIT_FETCHER,
+    )
 
-                author = submission.author
+    while not stop.is_set():
+        try:
+            if time.time() - last_reload > WATCHLIST_UPDATE_INTERVAL:
 
-                if not author:
-                    print(f"no author {submission.id}")
+                try:
+                    # One query feeds both the watchlist index and the mute cache
+                    timers = get_redditor_mute_timers()
+                    watchlist.rebuild(timers, get_subreddit_list())
+                    load_mute_cache(timers)
+                except Exception as e:
                     continue
 
-                author_name = author.name
+                author_poller.set_authors(timers)
 
-                if author_name not in users:
-                    continue
+                # Switching subreddits keeps the seen state of the streams
+                if streams.set_subreddits(watchlist.subreddit_names or ("test",)):
+                    print(watchlist.subreddit_string)
 
-                if muted(author_name):
-                    continue
+                last_reload = time.time()
 
-                add_submission(submission)
+            if time.time() - last_rebalance > REDDIT_SHARD_REBALANCE_INTERVAL:
+                for cadence in streams.cadence_report():
+                    print(f"[Cadence] {cadence}")
 
-            time.sleep(REDDIT_POLL_INTERVAL)
+                for stage in pipeline.report():
+                    print(f"[Pipeline] {stage}")
 
-        except (RequestException, ResponseException, ServerError) as e:
+                print(f"[Seen cache] {seen_cache_report()}")
+
+                streams.rebalance()
+
+                # The firehose is idle in author mode, probe it once per interval
+                probe_due = mode == AUTHORS
+
+                if REDDIT_INGESTION_MODE == "auto":
+                    new_mode = choose_ingestion_mode(
+                        mode,
+                        author_count=len(watchlist),
+                        items_per_poll=streams.items_per_poll(),
+                        shard_count=streams.shards,
+                        poll_interval=streams.mean_interval(),
+                        author_interval=author_poller.scheduler.mean_interval(),
+                    )
+
+                    if new_mode != mode:
+                        print(f"Switching ingestion mode: {mode} -> {new_mode}")
+
+                        if new_mode == AUTHORS:
+                            author_poller.resume_from(
+                                resume_point(comment_checkpoint, submission_checkpoint)
+                            )
+
+                        mode = new_mode
+
+                last_rebalance = time.time()
+
+            fetch_started = time.monotonic()
+            watermarks: dict[str, tuple[str, float]] = {}
+
+            if mode == AUTHORS:
+                # User listings span all of reddit, keep the watched subreddits only
+                comments, submissions = author_poller.poll(REDDIT_AUTHORS_PER_PASS)
+                comments = [
+                    c for c in comments if watchlist.is_watched_subreddit(str(c.subreddit))
+                ]
+                submissions = [
+                    s
+                    for s in submissions
+                    if watchlist.is_watched_subreddit(str(s.subreddit))
+                ]
+
+                if probe_due:
+                    # One firehose poll keeps its traffic numbers current for the mode
+                    # planner and moves its checkpoints, so a restart does not replay the
+                    # whole stretch in author mode. Items both sources return are dropped
+                    # by the writer's seen cache.
+                    probe_due = False
+                    covered = author_poller.covered_until()
+                    probe_comments, probe_submissions = streams.poll(probe=True)
+                    comments += [c for c in probe_comments if comment_checkpoint.is_new(c)]
+                    submissions += [
+                        s for s in probe_submissions if submission_checkpoint.is_new(s)
+                    ]
+
+                    for stream, watermark, items in (
+                        ("comments", streams.comment_watermark(), probe_comments),
+                        ("submissions", streams.submission_watermark(), probe_submissions),
+                    ):
+                        watermark = capped_watermark(watermark, items, covered)
+
+                        if watermark:
+                            watermarks[stream] = watermark
+
+            else:
+                comments, submissions = streams.poll()
+                # Drops the replay of the last run only, repeats within a run are already gone
+                comments = [c for c in comments if comment_checkpoint.is_new(c)]
+                submissions = [s for s in submissions if submission_checkpoint.is_new(s)]
+
+                # Checkpoints move once the persist stage has written this pass
+                for stream, watermark in (
+                    ("comments", streams.comment_watermark()),
+                    ("submissions", streams.submission_watermark()),
+                ):
+                    if watermark:
+                        watermarks[stream] = watermark
+
+            if comments or submissions or watermarks:
+                pipeline.submit(
+                    IngestBatch(comments, submissions, watermarks),
+                    time.monotonic() - fetch_started,
+                )
+
+            # Sleep until the next stream or author is due, but wake up for watchlist reloads
+            next_due = (
+                author_poller.scheduler.next_due()
+                if mode == AUTHORS
+                else streams.next_due()
+            )
+            stop.wait(
+                min(max(next_due - time.time(), 0.2), WATCHLIST_UPDATE_INTERVAL)
+            )
+
+        except (RequestException, ResponseException, ServerError, httpx.HTTPError) as e:
             print(f"[Error] {e}. Sleeping 30s before retry...")
-            time.sleep(30)
+            stop.wait(30)
 
         except KeyboardInterrupt:
             print("🛑 Shutting down watcher.")
@@ -119,11 +369,17 @@ def watch_loop():
 
         except Exception as e:
             print(f"[Unexpected Error] {e}")
-            time.sleep(10)
+            stop.wait(10)
 
         finally:
             pass
 
+    pipeline.close()
+    flush_notifications(force=True)
+    streams.close()
+
 
 if __name__ == "__main__":
+    # Exit cleanly on terminate so buffered notifications get flushed
+    signal.signal(signal.SIGTERM, lambda sig, frame: sys.exit(0))
     watch_loop()
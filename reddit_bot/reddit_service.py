@@ -1,67 +1,198 @@
+import atexit
+import logging
+import threading
+from itertools import islice
+from typing import Callable, Iterable
+
 import praw
+import requests
 from praw.models import Comment, Submission
-from prawcore.exceptions import NotFound, Redirect
-
-from config.config import REDDIT_CLIENT_ID, REDDIT_CLIENT_SECRET, REDDIT_USER_AGENT
+from prawcore.exceptions import NotFound, PrawcoreException, Redirect
+
+from config.config import (
+    NOTIFICATION_BATCH_SIZE,
+    NOTIFICATION_FLUSH_INTERVAL,
+    NOTIFICATION_SEEN_CACHE_SIZE,
+    NOTIFY_SOCKET_PATH,
+    REDDIT_CLIENT_ID,
+    REDDIT_CLIENT_SECRET,
+    REDDIT_EXISTS_TTL,
+    REDDIT_HTTP_POOL_SIZE,
+    REDDIT_NOT_FOUND_TTL,
+    REDDIT_USER_AGENT,
+)
 from db.crud import (
-    add_comment_to_db,
-    add_submission_to_db,
-    get_watched_redditors,
+    comment_to_row,
+    get_mute_timers,
+    get_recent_notification_fullnames,
+    get_stream_checkpoints,
     get_watched_subreddits,
-    is_muted,
+    set_stream_checkpoints,
+    submission_to_row,
 )
+from db.cache import ExistenceCache, SeenIdCache, mute_cache
 from db.session import SessionLocal
+from db.writer import NotificationWriter
+from ipc.wakeup import send_wakeup
+from reddit_bot.async_fetcher import AsyncListingFetcher, AsyncRedditClient
+from reddit_bot.budget import VALIDATION, reddit_budget
+
+logger = logging.getLogger("reddit_watcher." + __name__)
+
+# Names per /api/info request, the most Reddit accepts
+INFO_BATCH_SIZE = 100
+
+notification_writer = NotificationWriter(
+    SessionLocal,
+    max_batch=NOTIFICATION_BATCH_SIZE,
+    max_delay=NOTIFICATION_FLUSH_INTERVAL,
+    on_flush=lambda rows: send_wakeup(NOTIFY_SOCKET_PATH),
+    seen=SeenIdCache(NOTIFICATION_SEEN_CACHE_SIZE),
+)
+atexit.register(notification_writer.close)
+
+existence_cache = ExistenceCache(REDDIT_EXISTS_TTL, REDDIT_NOT_FOUND_TTL)
+
+# One lookup client per thread, see `get_lookup_reddit`
+_lookup_clients = threading.local()
 
 
 def get_reddit() -> praw.Reddit:
     """
-    Create and return a Reddit client.
+    Create and return a Reddit client. Its rate limit headers feed the shared request budget.
     """
-    return praw.Reddit(
+    reddit = praw.Reddit(
         client_id=REDDIT_CLIENT_ID,
         client_secret=REDDIT_CLIENT_SECRET,
         user_agent=REDDIT_USER_AGENT,
     )
+    reddit_budget.register(reddit)
 
+    return reddit
 
-def redditor_exists(name: str) -> bool:
+
+def get_async_fetcher() -> AsyncListingFetcher:
     """
-    Function to check if redditor exists
+    Create an async listing fetcher. It joins the shared request budget like the praw clients.
+    """
+    client = AsyncRedditClient(
+        REDDIT_CLIENT_ID or "",
+        REDDIT_CLIENT_SECRET or "",
+        REDDIT_USER_AGENT,
+        pool_size=REDDIT_HTTP_POOL_SIZE,
+    )
+
+    return AsyncListingFetcher(client)
+
+
+def get_lookup_reddit() -> praw.Reddit:
+    """
+    Returns the Reddit client for one-off lookups of the calling thread.
+
+    praw is not thread-safe, so every worker thread checking names gets a client and HTTPS
+    session of its own. It is created once per thread, the OAuth token and the connection are
+    reused by every later validation on that thread.
+    """
+    reddit = getattr(_lookup_clients, "reddit", None)
+
+    if reddit is None:
+        session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=1)
+        session.mount("https://", adapter)
+
+        reddit = praw.Reddit(
+            client_id=REDDIT_CLIENT_ID,
+            client_secret=REDDIT_CLIENT_SECRET,
+            user_agent=REDDIT_USER_AGENT,
+            requestor_kwargs={"session": session},
+        )
+        reddit_budget.register(reddit)
+        _lookup_clients.reddit = reddit
+
+    return reddit
+
+
+def _exists(kind: str, name: str, lookup: Callable[[praw.Reddit, str], object]) -> bool:
+    """
+    Cached existence check. Errors other than "not found" are raised and not cached.
     """
+    cached = existence_cache.get(kind, name)
+
+    if cached is not None:
+        return cached
+
     try:
-        reddit = get_reddit()
-        reddit.redditor(name).id
+        reddit_budget.acquire(VALIDATION)
+        lookup(get_lookup_reddit(), name)
+        exists = True
 
-    except NotFound:
-        return False
+    except (NotFound, Redirect, AttributeError):
+        exists = False
 
-    except Redirect:
-        return False
+    existence_cache.set(kind, name, exists)
+    return exists
 
-    except AttributeError:
-        return False
 
-    return True
+def redditor_exists(name: str) -> bool:
+    """
+    Function to check if redditor exists
+    """
+    return _exists("redditor", name, lambda reddit, n: reddit.redditor(n).id)
 
 
 def subreddit_exists(name: str) -> bool:
     """
     Function to check if subreddit exists
     """
-    try:
-        reddit = get_reddit()
-        reddit.subreddit(name).id
+    return _exists("subreddit", name, lambda reddit, n: reddit.subreddit(n).id)
 
-    except NotFound:
-        return False
 
-    except Redirect:
-        return False
+def subreddits_exist(names: Iterable[str]) -> dict[str, bool]:
+    """
+    Checks many subreddits at once, 100 names per /api/info request. Cached names cost nothing.
 
-    except AttributeError:
-        return False
+    A batch Reddit rejects as a whole, e.g. because of one malformed name, is checked name by
+    name instead. Names whose check failed are missing from the result.
+    """
+    result: dict[str, bool] = {}
+    unknown = []
+
+    for name in dict.fromkeys(names):
+        cached = existence_cache.get("subreddit", name)
+
+        if cached is None:
+            unknown.append(name)
+        else:
+            result[name] = cached
+
+    batches = iter(unknown)
+
+    while batch := list(islice(batches, INFO_BATCH_SIZE)):
+        try:
+            reddit_budget.acquire(VALIDATION)
+            found = {
+                sub.display_name.casefold()
+                for sub in get_lookup_reddit().info(subreddits=batch)
+            }
 
-    return True
+        except PrawcoreException:
+            logger.warning(f"Batch lookup of {len(batch)} subreddits failed, checking each")
+
+            for name in batch:
+                try:
+                    result[name] = subreddit_exists(name)
+
+                except PrawcoreException:
+                    logger.exception(f"Failed to check subreddit {name}")
+
+            continue
+
+        for name in batch:
+            exists = name.casefold() in found
+            existence_cache.set("subreddit", name, exists)
+            result[name] = exists
+
+    return result
 
 
 def is_author_of_parent(comment: Comment) -> bool:
@@ -74,54 +205,110 @@ def is_author_of_parent(comment: Comment) -> bool:
     return is_submitter
 
 
-def get_subreddits_string() -> str:
+def get_subreddit_list() -> list[str]:
     session = SessionLocal()
 
     try:
-        subreddits = get_watched_subreddits(session)
-        subreddit_string = "+".join(subreddits)
-        return subreddit_string
+        return get_watched_subreddits(session)
 
     finally:
         session.close()
 
 
-def get_redditor_list() -> list[str]:
+def get_redditor_mute_timers() -> dict[str, float]:
     session = SessionLocal()
 
     try:
-        redditors = get_watched_redditors(session)
-        return redditors
+        return get_mute_timers(session)
 
     finally:
         session.close()
 
 
+def load_mute_cache(timers: dict[str, float]) -> None:
+    """
+    Refresh the in-process mute cache. Mutes set in this process update it directly.
+    """
+    mute_cache.load(timers)
+
+
 def muted(redditor: str) -> bool:
+    """
+    Checks the in-process mute cache, no DB round-trip
+    """
+    return mute_cache.is_muted(redditor)
+
+
+def add_comment(comment: Comment) -> None:
+    """
+    Queues a comment for the next batched write
+    """
+    notification_writer.add(comment_to_row(comment))
+
+
+def add_submission(submission: Submission) -> None:
+    """
+    Queues a submission for the next batched write
+    """
+    notification_writer.add(submission_to_row(submission))
+
+
+def warm_seen_cache() -> None:
+    """
+    Fills the writer's seen cache with the newest stored notifications.
+    """
     session = SessionLocal()
 
     try:
-        return is_muted(session, redditor)
+        fullnames = get_recent_notification_fullnames(session, NOTIFICATION_SEEN_CACHE_SIZE)
 
     finally:
         session.close()
 
+    if notification_writer.seen is not None:
+        notification_writer.seen.warm(fullnames)
 
-def add_comment(comment: Comment) -> None:
+
+def seen_cache_report() -> dict:
+    return notification_writer.seen.report() if notification_writer.seen else {}
+
+
+def load_checkpoints() -> dict[str, tuple[str, float]]:
     session = SessionLocal()
 
     try:
-        add_comment_to_db(session, comment)
+        return get_stream_checkpoints(session)
 
     finally:
         session.close()
 
 
-def add_submission(submission: Submission) -> None:
+def save_checkpoints(checkpoints: dict[str, tuple[str, float]]) -> None:
+    """
+    Stores stream checkpoints. Call it only after the notifications up to them were flushed.
+    """
     session = SessionLocal()
 
     try:
-        add_submission_to_db(session, submission)
+        set_stream_checkpoints(session, checkpoints)
 
     finally:
         session.close()
+
+
+def set_notification_listener(listener: Callable[[list[dict]], None]) -> None:
+    """
+    Replaces what happens after a batch is written, e.g. handing the rows to the Telegram
+    sender in the single process mode instead of waking it up through the socket.
+    """
+    notification_writer.on_flush = listener
+
+
+def flush_notifications(force: bool = False) -> int:
+    """
+    Writes buffered notifications if the batch is due, or right away if `force` is set.
+    """
+    if force:
+        return notification_writer.flush()
+
+    return notification_writer.flush_if_due()
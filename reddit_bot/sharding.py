@@ -0,0 +1,355 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Any, Callable, Iterable
+
+import praw
+
+from reddit_bot.checkpoints import item_position
+from reddit_bot.async_fetcher import AsyncListingFetcher
+from reddit_bot.raw_listings import PRAW, SUBREDDIT_LISTINGS
+from reddit_bot.streams import LISTING_LIMIT, ListingStream, StreamManager
+
+logger = logging.getLogger("reddit_watcher." + __name__)
+
+
+class TrafficStats:
+    """
+    Observed items per poll for each subreddit, smoothed with an exponential moving average.
+    """
+
+    def __init__(self, alpha: float = 0.2) -> None:
+        self.alpha = alpha
+        self._rates: dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def observe(
+        self, subreddits: Iterable[str], items: Iterable[Any], polls: float = 1.0
+    ) -> None:
+        """
+        Records the items of a listing that stands for `polls` regular polls.
+        """
+        counts = {name.casefold(): 0.0 for name in subreddits}
+
+        for item in items:
+            name = item_subreddit(item)
+            if name in counts:
+                counts[name] += 1 / polls
+
+        with self._lock:
+            for name, count in counts.items():
+                previous = self._rates.get(name)
+                self._rates[name] = (
+                    count
+                    if previous is None
+                    else previous + self.alpha * (count - previous)
+                )
+
+    def snapshot(self) -> dict[str, float]:
+        with self._lock:
+            return dict(self._rates)
+
+
+class SharedSeenSet:
+    """
+    Thread-safe bounded set of fullnames, drops items two shards returned in the same pass.
+    """
+
+    def __init__(self, max_items: int) -> None:
+        self.max_items = max_items
+        self._seen: OrderedDict[str, None] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def first_seen(self, fullname: str) -> bool:
+        with self._lock:
+            if fullname in self._seen:
+                self._seen.move_to_end(fullname)
+                return False
+
+            self._seen[fullname] = None
+            self._trim()
+            return True
+
+    def resize(self, max_items: int) -> None:
+        """
+        Changes the bound, a smaller one drops the oldest fullnames right away.
+        """
+        with self._lock:
+            self.max_items = max_items
+            self._trim()
+
+    def _trim(self) -> None:
+        while len(self._seen) > self.max_items:
+            self._seen.popitem(last=False)
+
+
+def item_subreddit(item: Any) -> str:
+    return str(item.subreddit).casefold()
+
+
+def polls_covered(items: list[Any], interval: float) -> float:
+    """
+    Regular polls of `interval` seconds a listing stands for, by the time span of its items
+    (oldest first). Used for probes long after the previous poll.
+    """
+    if len(items) < 2 or interval <= 0:
+        return 1.0
+
+    return max((items[-1].created_utc - items[0].created_utc) / interval, 1.0)
+
+
+def plan_shards(
+    subreddits: Iterable[str],
+    traffic: dict[str, float],
+    shard_count: int,
+    max_chars: int,
+) -> list[list[str]]:
+    """
+    Splits the subreddits into balanced shards.
+
+    Busiest subreddits are placed first, each one on the shard with the lowest traffic so far.
+    Subreddits without observed traffic weigh as much as an average one. A shard never gets a
+    multireddit string longer than `max_chars`, more shards are opened instead.
+    """
+    names = list(dict.fromkeys(subreddits))
+    known = [traffic[name.casefold()] for name in names if name.casefold() in traffic]
+    default = sum(known) / len(known) if known else 1.0
+
+    def weight(name: str) -> float:
+        return traffic.get(name.casefold(), default)
+
+    shards: list[list[str]] = [[] for _ in range(max(shard_count, 1))]
+    loads = [0.0] * len(shards)
+    chars = [0] * len(shards)
+
+    for name in sorted(names, key=lambda n: (-weight(n), n)):
+        size = len(name) + 1
+        candidates = [i for i in range(len(shards)) if chars[i] + size <= max_chars]
+
+        if not candidates:
+            shards.append([])
+            loads.append(0.0)
+            chars.append(0)
+            candidates = [len(shards) - 1]
+
+        target = min(candidates, key=lambda i: (loads[i], len(shards[i])))
+        shards[target].append(name)
+        loads[target] += weight(name)
+        chars[target] += size
+
+    return [sorted(shard) for shard in shards if shard]
+
+
+class ShardedStreams:
+    """
+    Runs the comment and submission streams of every shard on worker threads.
+
+    Each shard has its own StreamManager and praw client. All due streams are fetched at once,
+    on the thread pool or, with an `async_fetcher`, concurrently on its event loop. Results of
+    all shards are merged, deduplicated by fullname and returned oldest first. The watermark of a stream kind is the
+    oldest "newest item" over all shards, a checkpoint there never skips items a slower shard
+    has not returned yet.
+    """
+
+    def __init__(
+        self,
+        reddit_factory: Callable[[], praw.Reddit],
+        shard_count: int = 1,
+        max_chars: int = 2000,
+        poll_interval: float = 5,
+        min_interval: float = 1,
+        max_interval: float = 60,
+        fetcher: str = PRAW,
+        async_fetcher: AsyncListingFetcher | None = None,
+    ) -> None:
+        self._reddit_factory = reddit_factory
+        self._intervals = (poll_interval, min_interval, max_interval)
+        self._fetcher = fetcher
+        self._async_fetcher = async_fetcher
+        self.shard_count = shard_count
+        self.max_chars = max_chars
+        self.traffic = TrafficStats()
+        self.subreddits: tuple[str, ...] = ()
+        self._shards: list[StreamManager] = []
+        self._seen = SharedSeenSet(3 * LISTING_LIMIT)
+        self._pool: ThreadPoolExecutor | None = None
+        self._pool_size = 0
+
+    @property
+    def shards(self) -> int:
+        return len(self._shards)
+
+    def items_per_poll(self) -> float:
+        return sum(self.traffic.snapshot().values())
+
+    def set_subreddits(self, subreddits: Iterable[str]) -> bool:
+        """
+        Reshards for a new subreddit set. Returns True if it changed.
+        """
+        subreddits = tuple(subreddits)
+
+        if subreddits == self.subreddits:
+            return False
+
+        self.subreddits = subreddits
+        self.rebalance()
+        return True
+
+    def rebalance(self) -> None:
+        """
+        Re-plans the shards from the observed traffic. Existing streams keep their seen state.
+        """
+        plan = plan_shards(
+            self.subreddits, self.traffic.snapshot(), self.shard_count, self.max_chars
+        )
+
+        while len(self._shards) < len(plan):
+            self._shards.append(
+                StreamManager(
+                    self._reddit_factory(),
+                    f"shard{len(self._shards)}",
+                    *self._intervals,
+                    fetcher=self._fetcher,
+                )
+            )
+
+        del self._shards[len(plan) :]
+        # The character cap may open more shards than configured, size for the actual plan
+        self._seen.resize(3 * LISTING_LIMIT * max(len(plan), 1))
+
+        for shard, names in zip(self._shards, plan):
+            shard.set_subreddits("+".join(names))
+
+        # Comments and submissions of every shard may be due at the same time
+        if self._pool is None or self._pool_size < 2 * len(plan):
+            if self._pool:
+                self._pool.shutdown(wait=False)
+            self._pool_size = max(2 * len(plan), 1)
+            self._pool = ThreadPoolExecutor(
+                max_workers=self._pool_size, thread_name_prefix="shard"
+            )
+
+        logger.info(f"Watching {len(self.subreddits)} subreddits in {len(plan)} shards")
+
+    def _fetch(self, due: list[tuple[StreamManager, ListingStream]]) -> list[Any]:
+        """
+        Polls the due streams at once. A failed poll gives its exception instead of items.
+        """
+        if self._async_fetcher is not None:
+            paths = [
+                SUBREDDIT_LISTINGS[stream.kind].format(shard.subreddits)
+                for shard, stream in due
+            ]
+            listings = self._async_fetcher.fetch_all(paths, LISTING_LIMIT)
+
+            return [
+                listing if isinstance(listing, BaseException) else stream.accept(listing)
+                for (_, stream), listing in zip(due, listings)
+            ]
+
+        futures = [self._pool.submit(stream.poll, shard.subreddits) for shard, stream in due]
+        wait(futures)
+
+        return [future.exception() or future.result() for future in futures]
+
+    def poll(self, probe: bool = False) -> tuple[list[Any], list[Any]]:
+        """
+        Polls the due comment and submission streams of all shards, a slow listing does not
+        hold back the others. Returns the new comments and submissions, oldest first.
+
+        A `probe` polls every stream, due or not. It is meant for occasional polls while the
+        watcher is in author mode, its listings cover a long stretch and are scaled down to one
+        regular poll for the traffic stats.
+        """
+        if not self._shards or self._pool is None:
+            return [], []
+
+        # Only streams that are due, each stream has its own adaptive cadence
+        now = time.time()
+        due = [
+            (shard, stream)
+            for shard in self._shards
+            for stream in shard.streams
+            if probe or stream.cadence.is_due(now)
+        ]
+        # Before the poll, accepting a listing updates the cadence
+        intervals = [stream.cadence.interval for _, stream in due]
+
+        merged: dict[str, list[Any]] = {"comments": [], "submissions": []}
+        errors = []
+
+        for (shard, stream), interval, items in zip(due, intervals, self._fetch(due)):
+            # Failed streams keep their position and back off on their own, the others go on
+            if isinstance(items, BaseException):
+                wait = stream.cadence.back_off()
+                logger.warning(
+                    f"Polling {stream.cadence.name} failed, retrying in {wait:.0f}s: {items!r}"
+                )
+                errors.append(items)
+                continue
+
+            polls = polls_covered(items, interval) if probe else 1.0
+            self.traffic.observe(shard.subreddits.split("+"), items, polls)
+            merged[stream.kind].extend(
+                item for item in items if self._seen.first_seen(item.fullname)
+            )
+
+        # Only a failure of every stream is worth the watcher's error back-off
+        if errors and all(
+            stream.cadence.failures for shard in self._shards for stream in shard.streams
+        ):
+            raise errors[0]
+
+        for items in merged.values():
+            items.sort(key=lambda item: item_position(item.created_utc, item.id))
+
+        return merged["comments"], merged["submissions"]
+
+    def _watermark(
+        self, select: Callable[[StreamManager], ListingStream]
+    ) -> tuple[str, float] | None:
+        newest = [select(shard).newest for shard in self._shards]
+        newest = [n for n in newest if n is not None]
+
+        if not newest:
+            return None
+
+        return min(
+            newest,
+            key=lambda n: item_position(n[1], n[0].split("_", 1)[-1]),
+        )
+
+    def comment_watermark(self) -> tuple[str, float] | None:
+        return self._watermark(lambda shard: shard.comments)
+
+    def submission_watermark(self) -> tuple[str, float] | None:
+        return self._watermark(lambda shard: shard.submissions)
+
+    def next_due(self) -> float:
+        """
+        Time at which the next stream of any shard is due.
+        """
+        due = [stream.cadence.next_due for shard in self._shards for stream in shard.streams]
+        return min(due, default=time.time())
+
+    def mean_interval(self) -> float:
+        intervals = [
+            stream.cadence.interval for shard in self._shards for stream in shard.streams
+        ]
+        return sum(intervals) / len(intervals) if intervals else self._intervals[0]
+
+    def cadence_report(self) -> list[dict]:
+        return [
+            stream.cadence.report() for shard in self._shards for stream in shard.streams
+        ]
+
+    def close(self) -> None:
+        if self._pool:
+            self._pool.shutdown(wait=False)
+            self._pool = None
+
+        if self._async_fetcher:
+            self._async_fetcher.close()
+            self._async_fetcher = None
@@ -0,0 +1,133 @@
+import logging
+from typing import Any, Callable
+
+import praw
+from praw.models.util import BoundedSet
+
+from reddit_bot.budget import STREAM, reddit_budget
+from reddit_bot.cadence import StreamCadence
+from reddit_bot.checkpoints import item_position
+from reddit_bot.raw_listings import PRAW, RAW, fetch_subreddit_listing
+
+logger = logging.getLogger("reddit_watcher." + __name__)
+
+# Reddit listings return at most 100 items
+LISTING_LIMIT = 100
+
+
+class ListingStream:
+    """
+    Polls one listing (comments or submissions) of the watched multireddit.
+
+    Keeps the seen fullnames and the newest fullname across polls and across changes of the
+    subreddit set, unlike praw's stream generators which start from scratch when rebuilt.
+    Every poll is reported to the stream's cadence, which decides when it is due again.
+    """
+
+    def __init__(
+        self,
+        kind: str,
+        fetch: Callable[[str, int], list[Any]],
+        cadence: StreamCadence,
+        seen_size: int = 3 * LISTING_LIMIT,
+    ) -> None:
+        self.kind = kind
+        self.cadence = cadence
+        self._fetch = fetch
+        self._seen = BoundedSet(seen_size)
+        self.newest: tuple[str, float] | None = None
+        self._newest_position: tuple[float, int] | None = None
+
+    def poll(self, subreddits: str) -> list[Any]:
+        """
+        Fetches the newest listing of `subreddits` and returns the unseen items, oldest first.
+        """
+        reddit_budget.acquire(STREAM)
+        return self.accept(self._fetch(subreddits, LISTING_LIMIT))
+
+    def accept(self, items: list[Any]) -> list[Any]:
+        """
+        Takes a listing fetched elsewhere, newest first, and returns the unseen items.
+        """
+        new_items = []
+
+        for item in reversed(items):
+            if item.fullname in self._seen:
+                continue
+
+            self._seen.add(item.fullname)
+            new_items.append(item)
+
+        for item in new_items:
+            position = item_position(item.created_utc, item.id)
+
+            if self._newest_position is None or position > self._newest_position:
+                self._newest_position = position
+                self.newest = (item.fullname, item.created_utc)
+
+        self.cadence.record(len(items), len(new_items))
+
+        return new_items
+
+
+class StreamManager:
+    """
+    Owns the comment and submission streams of the watcher.
+
+    Changing the subreddit set only changes what the next poll fetches. The seen state carries
+    over, so adding one subreddit does not replay the listings of all the others.
+    With the "raw" fetcher the listings are read as JSON into ListingItem records instead of
+    praw models.
+    """
+
+    def __init__(
+        self,
+        reddit: praw.Reddit,
+        name: str = "main",
+        poll_interval: float = 5,
+        min_interval: float = 1,
+        max_interval: float = 60,
+        fetcher: str = PRAW,
+    ) -> None:
+        self.subreddits = ""
+        self.comments = ListingStream(
+            "comments",
+            self._fetch_function(reddit, fetcher, "comments"),
+            StreamCadence(
+                f"comments/{name}", poll_interval, min_interval, max_interval
+            ),
+        )
+        self.submissions = ListingStream(
+            "submissions",
+            self._fetch_function(reddit, fetcher, "submissions"),
+            StreamCadence(
+                f"submissions/{name}", poll_interval, min_interval, max_interval
+            ),
+        )
+
+    @staticmethod
+    def _fetch_function(
+        reddit: praw.Reddit, fetcher: str, kind: str
+    ) -> Callable[[str, int], list[Any]]:
+        if fetcher == RAW:
+            return lambda subs, limit: fetch_subreddit_listing(reddit, kind, subs, limit)
+
+        if kind == "comments":
+            return lambda subs, limit: list(reddit.subreddit(subs).comments(limit=limit))
+
+        return lambda subs, limit: list(reddit.subreddit(subs).new(limit=limit))
+
+    @property
+    def streams(self) -> tuple[ListingStream, ListingStream]:
+        return (self.comments, self.submissions)
+
+    def set_subreddits(self, subreddits: str) -> bool:
+        """
+        Switches the streams to a new subreddit set. Returns True if it changed.
+        """
+        if subreddits == self.subreddits:
+            return False
+
+        logger.info(f"Watching subreddits: {subreddits}")
+        self.subreddits = subreddits
+        return True
@@ -0,0 +1,73 @@
+from dataclasses import dataclass, field
+from typing import Iterable
+
+"""WATCHLIST INDEX"""
+
+
+def normalize_name(name: str) -> str:
+    """
+    Normalize a redditor or subreddit name for lookups. Reddit names are case insensitive.
+    """
+    return name.strip().casefold()
+
+
+@dataclass(frozen=True)
+class WatchlistSnapshot:
+    """Immutable view of the watchlist at one point in time"""
+
+    authors: frozenset[str] = field(default_factory=frozenset)
+    subreddits: frozenset[str] = field(default_factory=frozenset)
+    subreddit_names: tuple[str, ...] = ()
+    subreddit_string: str = ""
+
+
+class WatchlistIndex:
+    """
+    In-memory index of the watched redditors and active subreddits.
+
+    Membership checks are O(1) against a case-normalized set. The index is rebuilt by swapping
+    a complete snapshot, so readers never see a half updated watchlist.
+    """
+
+    def __init__(self) -> None:
+        self._snapshot = WatchlistSnapshot()
+
+    @property
+    def snapshot(self) -> WatchlistSnapshot:
+        return self._snapshot
+
+    @property
+    def subreddit_string(self) -> str:
+        return self._snapshot.subreddit_string
+
+    @property
+    def subreddit_names(self) -> tuple[str, ...]:
+        return self._snapshot.subreddit_names
+
+    def rebuild(self, authors: Iterable[str], subreddits: Iterable[str]) -> bool:
+        """
+        Replace the index with a new watchlist. Returns True if anything changed.
+        """
+        subreddit_names = sorted({name.strip() for name in subreddits if name.strip()})
+
+        snapshot = WatchlistSnapshot(
+            authors=frozenset(normalize_name(name) for name in authors if name.strip()),
+            subreddits=frozenset(normalize_name(name) for name in subreddit_names),
+            subreddit_names=tuple(subreddit_names),
+            subreddit_string="+".join(subreddit_names),
+        )
+
+        if snapshot == self._snapshot:
+            return False
+
+        self._snapshot = snapshot
+        return True
+
+    def is_watched_author(self, author_name: str) -> bool:
+        return author_name.casefold() in self._snapshot.authors
+
+    def is_watched_subreddit(self, subreddit_name: str) -> bool:
+        return normalize_name(subreddit_name) in self._snapshot.subreddits
+
+    def __len__(self) -> int:
+        return len(self._snapshot.authors)
@@ -0,0 +1,157 @@
+import asyncio
+import logging
+import time
+from datetime import timedelta
+from typing import Awaitable, Callable
+
+from telegram.error import RetryAfter
+
+logger = logging.getLogger("reddit_watcher." + __name__)
+
+
+class TokenBucket:
+    """
+    Async token bucket. `rate` tokens are refilled per second up to `capacity`.
+
+    `pause` blocks the bucket completely, used when Telegram answers with RetryAfter.
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        capacity: float | None = None,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], Awaitable[None]] = asyncio.sleep,
+    ) -> None:
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(rate, 1)
+        self._clock = clock
+        self._sleep = sleep
+        self._tokens = self.capacity
+        self._updated = clock()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(
+            self.capacity, self._tokens + (now - self._updated) * self.rate
+        )
+        self._updated = now
+
+    async def acquire(self) -> None:
+        async with self._lock:
+            while True:
+                now = self._clock()
+
+                if now < self._paused_until:
+                    await self._sleep(self._paused_until - now)
+                    continue
+
+                self._refill(now)
+
+                # Tolerate float rounding, else a refill that lands just below 1 never completes
+                if self._tokens >= 1 - 1e-9:
+                    self._tokens = max(self._tokens - 1, 0.0)
+                    return
+
+                await self._sleep((1 - self._tokens) / self.rate)
+
+    def pause(self, seconds: float) -> None:
+        self._paused_until = max(self._paused_until, self._clock() + seconds)
+        self._tokens = 0
+
+
+def retry_after_seconds(error: RetryAfter) -> float:
+    retry_after = error.retry_after
+
+    if isinstance(retry_after, timedelta):
+        return retry_after.total_seconds()
+
+    return float(retry_after)
+
+
+class DeliveryEngine:
+    """
+    Sends messages to many chats concurrently within Telegram's rate limits.
+
+    Every chat gets its own worker that sends the messages in order, so per-chat ordering is kept.
+    At most `max_concurrency` chats are served at the same time. Each send takes a token from the
+    chat's bucket and from the global bucket. A RetryAfter only pauses the bucket of that chat.
+    """
+
+    def __init__(
+        self,
+        bot,
+        global_rate: float = 30,
+        chat_rate: float = 1,
+        max_concurrency: int = 50,
+        max_retries: int = 3,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], Awaitable[None]] = asyncio.sleep,
+    ) -> None:
+        self.bot = bot
+        self.chat_rate = chat_rate
+        self.max_retries = max_retries
+        self._clock = clock
+        self._sleep = sleep
+        self._global_bucket = TokenBucket(global_rate, clock=clock, sleep=sleep)
+        self._chat_buckets: dict[str, TokenBucket] = {}
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+    def _chat_bucket(self, chat_id: str) -> TokenBucket:
+        bucket = self._chat_buckets.get(chat_id)
+
+        if bucket is None:
+            bucket = TokenBucket(
+                self.chat_rate, capacity=1, clock=self._clock, sleep=self._sleep
+            )
+            self._chat_buckets[chat_id] = bucket
+
+        return bucket
+
+    async def _send(self, chat_id: str, text: str) -> bool:
+        bucket = self._chat_bucket(chat_id)
+
+        for _ in range(self.max_retries + 1):
+            await bucket.acquire()
+            await self._global_bucket.acquire()
+
+            try:
+                await self.bot.send_message(chat_id=chat_id, text=text)
+                return True
+
+            except RetryAfter as e:
+                seconds = retry_after_seconds(e)
+                logger.warning(f"Rate limited on {chat_id}, pausing it for {seconds}s")
+                bucket.pause(seconds)
+
+            except Exception as e:
+                logger.exception(f"Failed to send to {chat_id}: {e}")
+                return False
+
+        logger.error(f"Giving up on {chat_id} after {self.max_retries} retries")
+        return False
+
+    async def _deliver_to_chat(self, chat_id: str, messages: list[str]) -> int:
+        sent = 0
+
+        async with self._semaphore:
+            for text in messages:
+                if await self._send(chat_id, text):
+                    sent += 1
+
+        logger.info(f"Sent {sent}/{len(messages)} messages to {chat_id}")
+        return sent
+
+    async def deliver(self, messages: list[str], chat_ids: list[str]) -> int:
+        """
+        Send all `messages` in order to every chat. Returns the number of messages sent.
+        """
+        if not messages or not chat_ids:
+            return 0
+
+        results = await asyncio.gather(
+            *(self._deliver_to_chat(chat_id, messages) for chat_id in chat_ids)
+        )
+
+        return sum(results)
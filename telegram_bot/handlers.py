@@ -1,6 +1,6 @@
 import asyncio
 import logging
-from typing import Any, cast
+from typing import Any, Sequence, cast
 
 from telegram import (
     CallbackQuery,
@@ -13,6 +13,7 @@ from telegram import (
     User,
 )
 from telegram.ext import (
+    Application,
     ApplicationBuilder,
     CallbackQueryHandler,
     CommandHandler,
@@ -22,23 +23,33 @@ from telegram.ext import (
     filters,
 )
 
-from config.config import TELEGRAM_BOT_TOKEN
-from db.exceptions import (
-    RedditorAlreadyActiveError,
-    RedditorAlreadyInactiveError,
-    SubredditAlreadyActiveError,
-    SubredditAlreadyInactiveError,
+from config.config import (
+    NOTIFICATION_PAGE_SIZE,
+    NOTIFICATION_POLL_INTERVAL,
+    NOTIFICATION_RETENTION_INTERVAL,
+    NOTIFY_SOCKET_PATH,
+    TELEGRAM_BOT_TOKEN,
+    TELEGRAM_CHAT_RATE,
+    TELEGRAM_GLOBAL_RATE,
+    TELEGRAM_MAX_CONCURRENCY,
 )
+from db.crud import ADDED, ALREADY_ACTIVE, REACTIVATED
+from db.exceptions import RedditorAlreadyInactiveError, SubredditAlreadyInactiveError
+from ipc.wakeup import WakeupListener
 from telegram_bot.decorators.handler_decorators import Check, require_checks
+from telegram_bot.delivery import DeliveryEngine
 from telegram_bot.service import (
-    add_redditor_to_db,
-    add_subreddit_to_db,
+    FAILED,
+    NOT_FOUND,
+    add_redditors_to_db,
+    add_subreddits_to_db,
+    apply_notification_retention,
     close_pending_notifications,
     get_help,
-    get_rating_of_redditor,
+    get_ratings_of_redditors,
     list_active_telegram_users_chat_ids,
     list_muted_redditors,
-    list_pending_notifications,
+    iter_pending_notifications,
     list_redditors,
     list_redditors_with_rating,
     list_subreddits,
@@ -138,6 +149,43 @@ async def cancel_conversation(update: Update, _: ContextTypes.DEFAULT_TYPE) -> i
     return ConversationHandler.END
 
 
+# Telegram rejects longer messages
+MAX_MESSAGE_LENGTH = 4096
+
+ADD_REPORT_HEADINGS = {
+    ADDED: "✅ Added:",
+    REACTIVATED: "♻️ Reactivated:",
+    ALREADY_ACTIVE: "👀 Already watched:",
+    NOT_FOUND: "❓ Not found on Reddit:",
+    FAILED: "🚨 Failed to add:",
+}
+
+
+def format_add_report(report: dict[str, str]) -> Sequence[str]:
+    """
+    Groups the outcome per name of a bulk add by outcome. Long reports are split into several
+    messages.
+    """
+    lines = []
+
+    for outcome, heading in ADD_REPORT_HEADINGS.items():
+        names = [name for name, result in report.items() if result == outcome]
+
+        if names:
+            lines.append(heading)
+            lines.extend(names)
+
+    messages = [""]
+
+    for line in lines:
+        if len(messages[-1]) + len(line) + 1 > MAX_MESSAGE_LENGTH:
+            messages.append("")
+
+        messages[-1] += line + "\n"
+
+    return messages
+
+
 """REDDITOR COMMANDS"""
 
 
@@ -176,8 +224,8 @@ async def add_start(update: Update, _: ContextTypes.DEFAULT_TYPE) -> int:
 @require_checks([Check.MESSAGE])
 async def add_redditors(update: Update, _: ContextTypes.DEFAULT_TYPE) -> int:
     """
-    Step 1: Receiving the Redditors in a str, splitting it and for each Redditor try to add it to the db.
-    Respond to User with the Redditors that were added and those that failed.
+    Step 1: Receiving the Redditors in a str, splitting it and adding all of them to the db at once.
+    Respond to User with the outcome for each Redditor.
     """
     message: Message = cast(Message, update.message)
 
@@ -187,31 +235,16 @@ async def add_redditors(update: Update, _: ContextTypes.DEFAULT_TYPE) -> int:
         return ASK_FOR_REDDITORS_TO_ADD
 
     redditors = message.text.split()
-    added = []
-    failed = []
-
-    for redditor in redditors:
-        try:
-            await add_redditor_to_db(redditor)
-            added.append(redditor)
-
-        except RedditorAlreadyActiveError as e:
-            added.append(redditor)
-            logger.info(f"{e}")
-
-        except Exception as e:
-            failed.append(redditor)
-            logger.exception(f"{e}")
-
-    msg = ""
 
-    if added:
-        msg += f"✅ Added:\n{'\n'.join(added)}\n"
+    try:
+        report = await add_redditors_to_db(redditors)
 
-    if failed:
-        msg += f"🚨 Failed to add:\n{'\n'.join(failed)}\n"
+    except Exception as e:
+        logger.exception(f"{e}")
+        report = {redditor: FAILED for redditor in redditors}
 
-    await message.reply_text(msg)
+    for text in format_add_report(report):
+        await message.reply_text(text)
 
     return ConversationHandler.END
 
@@ -608,8 +641,8 @@ async def addsubs_start(update: Update, _: ContextTypes.DEFAULT_TYPE) -> int:
 @require_checks([Check.MESSAGE])
 async def add_subreddits(update: Update, _: ContextTypes.DEFAULT_TYPE) -> int:
     """
-    Step 1: Receiving the SUbreddits in a str, splitting it and for each Subreddit try to add it to the db.
-    Respond to User with the Subreddits that were added and those that failed.
+    Step 1: Receiving the SUbreddits in a str, splitting it and adding all of them to the db at once.
+    Respond to User with the outcome for each Subreddit.
     """
     message: Message = cast(Message, update.message)
 
@@ -618,30 +651,17 @@ async def add_subreddits(update: Update, _: ContextTypes.DEFAULT_TYPE) -> int:
         return ASK_FOR_SUBREDDITS_TO_ADD
 
     subreddits = message.text.split()
-    added = []
-    failed = []
-
-    for sub in subreddits:
-        try:
-            await add_subreddit_to_db(sub)
-            added.append(sub)
-
-        except SubredditAlreadyActiveError as e:
-            added.append(sub)
-            logger.info(f"{e}")
 
-        except Exception as e:
-            failed.append(sub)
-            logger.exception(f"{e}")
+    try:
+        report = await add_subreddits_to_db(subreddits)
 
-    msg = ""
+    except Exception as e:
+        logger.exception(f"{e}")
+        report = {sub: FAILED for sub in subreddits}
 
-    if added:
-        msg += f"✅ Added:\n{'\n'.join(added)}\n"
-    if failed:
-        msg += f"🚨 Failed to add:\n{'\n'.join(failed)}\n"
+    for text in format_add_report(report):
+        await message.reply_text(text)
 
-    await message.reply_text(msg)
     return ConversationHandler.END
 
 
@@ -695,45 +715,157 @@ async def remove_subreddit_button(update: Update, _: ContextTypes.DEFAULT_TYPE)
     return ConversationHandler.END
 
 
-async def send_pending_notifications(bot) -> None:
+def format_notification(note: dict, rating: int) -> str:
+    return f"📢 New {note['type']} by {note['author']}{'🚀' * rating}\n{note['url']}"
+
+
+async def deliver_notifications(
+    engine: DeliveryEngine, notes: Sequence[dict]
+) -> Sequence[str]:
+    """
+    Sends the notifications to all active Telegram users and marks them as delivered. Returns
+    the ids of the notes that were sent.
+
+    Notes read from the DB come with the author's rating joined in. Rows handed over by the
+    watcher do not, their ratings are read in one query for the whole batch.
+    """
+    if not notes:
+        return []
+
+    chat_ids = list_active_telegram_users_chat_ids()
+    notification_ids = []
+    messages = []
+
+    missing = [note["author"] for note in notes if "rating" not in note]
+    ratings = get_ratings_of_redditors(missing) if missing else {}
+
+    for note in notes:
+        rating = note["rating"] if "rating" in note else ratings.get(note["author"])
+
+        if rating is None:
+            logger.error(f"User not found: {note['author']}")
+            continue
+
+        messages.append(format_notification(note, rating))
+        notification_ids.append(note["id"])
+
+    await engine.deliver(messages, chat_ids)
+
+    try:
+        close_pending_notifications(notification_ids)
+    except Exception as e:
+        logger.exception(f"{e}")
+
+    return notification_ids
+
+
+def build_delivery_engine(bot) -> DeliveryEngine:
+    return DeliveryEngine(
+        bot,
+        global_rate=TELEGRAM_GLOBAL_RATE,
+        chat_rate=TELEGRAM_CHAT_RATE,
+        max_concurrency=TELEGRAM_MAX_CONCURRENCY,
+    )
+
+
+async def deliver_backlog(engine: DeliveryEngine) -> set[str]:
+    """
+    Delivers all pending notifications one page at a time, memory stays flat for any backlog.
+    Returns the ids that were sent.
+    """
+    sent: set[str] = set()
+
+    for page in iter_pending_notifications(NOTIFICATION_PAGE_SIZE):
+        sent.update(await deliver_notifications(engine, page))
+
+    return sent
+
+
+async def send_pending_notifications(
+    bot, wakeup: WakeupListener | None = None
+) -> None:
     """
     Background task to check DB for new notifications and send them.
+
+    Runs as soon as the watcher signals new notifications through `wakeup`, and falls back to
+    polling every NOTIFICATION_POLL_INTERVAL seconds.
     """
+    engine = build_delivery_engine(bot)
+
     while True:
 
-        new_items = list_pending_notifications()
-        chat_ids = list_active_telegram_users_chat_ids()
-        notification_ids = []
+        try:
+            await deliver_backlog(engine)
+        except Exception as e:
+            logger.exception(f"{e}")
 
-        for note in new_items:
+        if wakeup:
+            await wakeup.wait(NOTIFICATION_POLL_INTERVAL)
+        else:
+            await asyncio.sleep(NOTIFICATION_POLL_INTERVAL)
 
-            try:
-                rating = get_rating_of_redditor(cast(str, note.author))
 
+async def send_queued_notifications(bot, queue: asyncio.Queue) -> None:
+    """
+    Background task for the single process mode. The watcher puts each written batch of
+    notification rows on `queue`.
+
+    The DB is read for the backlog of earlier runs and whenever the queue stayed empty for
+    NOTIFICATION_POLL_INTERVAL seconds, like the polling of `send_pending_notifications`. That
+    retries notes whose send failed or that were skipped. A batch can be queued right after such
+    a drain already sent it, those ids are left out of the next queued batch.
+    """
+    engine = build_delivery_engine(bot)
+    drained: set[str] = set()
+    drain_due = True
+
+    while True:
+        if drain_due:
+            try:
+                drained = await deliver_backlog(engine)
             except Exception as e:
                 logger.exception(f"{e}")
-                continue
 
-            message = f"📢 New {note.type} by {note.author}{'🚀' * rating}\n{note.url}"
+        try:
+            notes = await asyncio.wait_for(queue.get(), NOTIFICATION_POLL_INTERVAL)
+        except TimeoutError:
+            drain_due = True
+            continue
+
+        drain_due = False
 
-            for chat_id in chat_ids:
-                try:
-                    await bot.send_message(chat_id=chat_id, text=message)
-                    logger.info(f"Sent message to {chat_id}")
+        while not queue.empty():
+            notes.extend(queue.get_nowait())
 
-                except Exception as e:
-                    logger.exception(f"Failed to send to {chat_id}: {e}")
-            notification_ids.append(note.id)
+        if drained:
+            notes = [note for note in notes if note["id"] not in drained]
+            drained = set()
 
         try:
-            close_pending_notifications(notification_ids)
-            notification_ids = []
+            await deliver_notifications(engine, notes)
         except Exception as e:
             logger.exception(f"{e}")
-        await asyncio.sleep(5)
 
 
-if __name__ == "__main__":
+async def run_retention_job() -> None:
+    """
+    Background task that archives and deletes old delivered notifications every
+    NOTIFICATION_RETENTION_INTERVAL seconds, on a worker thread.
+    """
+    while True:
+
+        try:
+            await asyncio.to_thread(apply_notification_retention)
+        except Exception as e:
+            logger.exception(f"{e}")
+
+        await asyncio.sleep(NOTIFICATION_RETENTION_INTERVAL)
+
+
+def build_application() -> Application:
+    """
+    Builds the Telegram Application with all command and conversation handlers registered.
+    """
     assert TELEGRAM_BOT_TOKEN
 
     app = ApplicationBuilder().token(TELEGRAM_BOT_TOKEN).build()
@@ -856,9 +988,30 @@ if __name__ == "__main__":
         ]
     )
 
-    # --- Startup event ---
-    async def on_startup(app):
-        asyncio.create_task(send_pending_notifications(app.bot))
+    return app
+
+
+async def on_startup(app: Application) -> None:
+    """
+    Starts the notification sender, woken up by the watcher process if a socket is configured,
+    and the retention job.
+    """
+    wakeup = None
 
+    if NOTIFY_SOCKET_PATH:
+        try:
+            wakeup = WakeupListener(NOTIFY_SOCKET_PATH)
+            wakeup.open()
+
+        except OSError as e:
+            wakeup = None
+            logger.exception(f"Wakeup socket unavailable, polling only: {e}")
+
+    asyncio.create_task(send_pending_notifications(app.bot, wakeup))
+    asyncio.create_task(run_retention_job())
+
+
+if __name__ == "__main__":
+    app = build_application()
     app.post_init = on_startup
     app.run_polling()
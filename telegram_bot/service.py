@@ -1,13 +1,22 @@
 import asyncio
-
+import logging
+from typing import Callable, Iterator
+
+from config.config import (
+    NOTIFICATION_ARCHIVE_DIR,
+    NOTIFICATION_RETENTION_BATCH_SIZE,
+    NOTIFICATION_RETENTION_DAYS,
+    NOTIFICATION_RETENTION_MAX_ROWS,
+    REDDIT_HTTP_POOL_SIZE,
+)
 from db.crud import (
     add_telegram_user,
-    add_watched_redditor,
-    add_watched_subreddit,
+    add_watched_redditors,
+    add_watched_subreddits,
     get_active_telegram_users_chat_ids,
     get_muted_watched_redditors,
-    get_pending_notifications,
-    get_rating,
+    get_pending_notifications_page,
+    get_ratings,
     get_watched_redditors,
     get_watched_redditors_with_rating,
     get_watched_subreddits,
@@ -18,10 +27,18 @@ from db.crud import (
     set_redditor_rating,
     unset_redditor_mute_timer,
 )
-from db.exceptions import RedditorDoesNotExistError, SubredditDoesNotExistError
-from db.models import Notification
-from db.session import SessionLocal
-from reddit_bot.reddit_service import redditor_exists, subreddit_exists
+from db.retention import RetentionPolicy, apply_retention
+from db.session import SessionLocal, engine
+from reddit_bot.reddit_service import (
+    redditor_exists,
+    subreddits_exist,
+)
+
+logger = logging.getLogger("reddit_watcher." + __name__)
+
+# Outcomes of bulk adds besides those of `crud.add_watched_*s`
+NOT_FOUND = "not_found"
+FAILED = "failed"
 
 """GENERAL COMMANDS"""
 
@@ -110,26 +127,71 @@ def list_muted_redditors() -> list[str]:
         session.close()
 
 
-async def add_redditor_to_db(username: str) -> None:
+async def _check_concurrently(
+    names: list[str], check: Callable[[str], bool]
+) -> dict[str, bool | None]:
+    """
+    Runs `check` for all names on worker threads, at most REDDIT_HTTP_POOL_SIZE at a time.
+    Every worker thread looks names up with its own Reddit client. A failed check gives None.
     """
-    Adds a Redditor to the db.
+    semaphore = asyncio.Semaphore(REDDIT_HTTP_POOL_SIZE)
+
+    async def run(name: str) -> bool | None:
+        async with semaphore:
+            try:
+                return await asyncio.to_thread(check, name)
 
-    Checks if the Redditor exists on Reddit and handles session management around `add_watched_redditor`.
+            except Exception:
+                logger.exception(f"Failed to check {name}")
+                return None
+
+    results = await asyncio.gather(*(run(name) for name in names))
+
+    return dict(zip(names, results))
+
+
+def _store_valid(
+    checked: dict[str, bool | None], store: Callable[[list[str]], dict[str, str]]
+) -> dict[str, str]:
+    """
+    Stores the names that exist and returns the outcome for every checked name.
     """
-    exists = await asyncio.to_thread(redditor_exists, username)
+    report = {
+        name: NOT_FOUND if exists is False else FAILED
+        for name, exists in checked.items()
+        if not exists
+    }
+    valid = [name for name, exists in checked.items() if exists]
+
+    if valid:
+        report.update(store(valid))
 
-    if not exists:
-        raise RedditorDoesNotExistError
+    return {name: report[name] for name in checked if name in report}
 
+
+def _store_redditors(usernames: list[str]) -> dict[str, str]:
     session = SessionLocal()
 
     try:
-        add_watched_redditor(session, username)
+        return add_watched_redditors(session, usernames)
 
     finally:
         session.close()
 
 
+async def add_redditors_to_db(usernames: list[str]) -> dict[str, str]:
+    """
+    Adds many Redditors to the db. Returns the outcome per name.
+
+    Checks the Redditors on Reddit concurrently, then adds or reactivates all existing ones in
+    one transaction.
+    """
+    names = list(dict.fromkeys(name.strip() for name in usernames if name.strip()))
+    checked = await _check_concurrently(names, redditor_exists)
+
+    return _store_valid(checked, _store_redditors)
+
+
 def remove_redditor_from_db(username: str) -> None:
     """
     Removes / deactivates a redditor from the db.
@@ -199,14 +261,14 @@ def rate_redditor(username: str, rating: int) -> None:
         session.close()
 
 
-def get_rating_of_redditor(username: str) -> int:
+def get_ratings_of_redditors(usernames: list[str]) -> dict[str, int]:
     """
-    Returns the Rating of specified Redditor
+    Returns the Ratings of many Redditors with one query. Unknown Redditors are left out.
     """
     session = SessionLocal()
 
     try:
-        return get_rating(session, username)
+        return get_ratings(session, usernames)
 
     finally:
         session.close()
@@ -244,24 +306,35 @@ def list_subreddits() -> list[str]:
         session.close()
 
 
-async def add_subreddit_to_db(subreddit_name: str) -> None:
+def _store_subreddits(subreddit_names: list[str]) -> dict[str, str]:
+    session = SessionLocal()
+
+    try:
+        return add_watched_subreddits(session, subreddit_names)
+
+    finally:
+        session.close()
+
+
+async def add_subreddits_to_db(subreddit_names: list[str]) -> dict[str, str]:
     """
-    Adds a Subreddit to the DB.
+    Adds many Subreddits to the DB. Returns the outcome per name.
 
-    Checks if Subreddit exists on Reddit and handles Session management aroud `add_watched_subreddit`.
+    Subreddits are checked in batches of 100 per Reddit request, then all existing ones are
+    added or reactivated in one transaction.
     """
-    exists = await asyncio.to_thread(subreddit_exists, subreddit_name)
+    names = list(dict.fromkeys(name.strip() for name in subreddit_names if name.strip()))
 
-    if not exists:
-        raise SubredditDoesNotExistError
+    try:
+        found = await asyncio.to_thread(subreddits_exist, names)
 
-    session = SessionLocal()
+    except Exception:
+        logger.exception("Failed to check subreddits")
+        found = {}
 
-    try:
-        add_watched_subreddit(session, subreddit_name)
+    checked = {name: found.get(name) for name in names}
 
-    finally:
-        session.close()
+    return _store_valid(checked, _store_subreddits)
 
 
 def remove_subreddit_from_db(subreddit_name: str) -> None:
@@ -279,19 +352,33 @@ def remove_subreddit_from_db(subreddit_name: str) -> None:
         session.close()
 
 
-def list_pending_notifications() -> list[Notification]:
+def iter_pending_notifications(page_size: int) -> Iterator[list[dict]]:
     """
-    Returns a List of all pendind Notifications.
+    Yields the pending Notifications page by page, oldest first.
 
-    Handles Session management around `get_pending_notifications`.
+    Pages follow the (created_utc, id) keyset, so a long backlog is never loaded at once. Every
+    page gets its own short session, no read transaction stays open while a page is delivered.
     """
-    session = SessionLocal()
+    after = None
 
-    try:
-        return get_pending_notifications(session)
+    while True:
+        session = SessionLocal()
 
-    finally:
-        session.close()
+        try:
+            page = get_pending_notifications_page(session, after, page_size)
+
+        finally:
+            session.close()
+
+        if not page:
+            return
+
+        yield page
+
+        if len(page) < page_size:
+            return
+
+        after = (page[-1]["created_utc"], page[-1]["id"])
 
 
 def close_pending_notifications(notification_ids: list[str]) -> None:
@@ -308,6 +395,22 @@ def close_pending_notifications(notification_ids: list[str]) -> None:
         session.close()
 
 
+def apply_notification_retention() -> dict:
+    """
+    Archives and deletes delivered Notifications by the configured retention policy.
+
+    Handles building the policy around `apply_retention`. Returns its statistics.
+    """
+    policy = RetentionPolicy(
+        max_age_days=NOTIFICATION_RETENTION_DAYS,
+        max_rows=NOTIFICATION_RETENTION_MAX_ROWS,
+        archive_dir=NOTIFICATION_ARCHIVE_DIR,
+        batch_size=NOTIFICATION_RETENTION_BATCH_SIZE,
+    )
+
+    return apply_retention(SessionLocal, engine, policy)
+
+
 def list_active_telegram_users_chat_ids() -> list[str]:
     """
     Returns a List of all Telegram User Chat IDS.
@@ -0,0 +1,417 @@
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy.orm import sessionmaker
+
+from db import writer as writer_module
+from db.cache import SeenIdCache
+from db.models import Base
+from db.session import create_db_engine
+from db.writer import NotificationWriter
+from reddit_bot import reddit_client, reddit_service
+from reddit_bot.budget import AUTHORS, STREAM, VALIDATION, RequestBudget
+from reddit_bot.cadence import StreamCadence
+from reddit_bot.checkpoints import CheckpointStore
+from reddit_bot.pipeline import DROP_NEWEST, IngestBatch, StageQueue
+from reddit_bot.reddit_client import capped_watermark, hold_checkpoints, persist_batch
+from reddit_bot.sharding import ShardedStreams, TrafficStats, plan_shards, polls_covered
+
+
+class FakeClock:
+    def __init__(self, now: float = 1000.0) -> None:
+        self.now = now
+        self.slept: list[float] = []
+
+    def __call__(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float) -> None:
+        self.slept.append(seconds)
+        self.now += seconds
+
+
+class StubReddit:
+    """
+    Stands in for praw.Reddit, only `auth.limits` is read by the budget.
+    """
+
+    def __init__(self, remaining: float | None, reset_timestamp: float | None) -> None:
+        self.auth = SimpleNamespace(
+            limits={"remaining": remaining, "reset_timestamp": reset_timestamp, "used": 0}
+        )
+
+
+@pytest.fixture
+def clock() -> FakeClock:
+    return FakeClock()
+
+
+def make_budget(clock: FakeClock, *clients) -> RequestBudget:
+    budget = RequestBudget(
+        shares={VALIDATION: 0.25, STREAM: 0.5, AUTHORS: 0.25},
+        safety_margin=0,
+        clock=clock,
+        sleep=clock.sleep,
+    )
+
+    for reddit in clients:
+        budget.register(reddit)
+
+    return budget
+
+
+def test_no_headers_yet_means_no_delay(clock):
+    reddit = StubReddit(None, None)
+    budget = make_budget(clock, reddit)
+
+    budget.acquire(STREAM)
+    budget.acquire(STREAM)
+
+    assert clock.slept == []
+
+
+def test_requests_are_spread_over_the_window(clock):
+    # 100 requests left, 100s to reset, streams may spend half: one request per 2s
+    reddit = StubReddit(100, clock.now + 100)
+    budget = make_budget(clock, reddit)
+
+    assert budget.delay(STREAM) == 0
+    assert budget.delay(STREAM) == pytest.approx(2.0)
+    assert budget.delay(STREAM) == pytest.approx(4.0)
+
+
+def test_each_priority_is_paced_by_its_share(clock):
+    reddit = StubReddit(100, clock.now + 100)
+    budget = make_budget(clock, reddit)
+
+    budget.delay(AUTHORS)
+    budget.delay(STREAM)
+
+    assert budget.delay(AUTHORS) == pytest.approx(4.0)
+    assert budget.delay(STREAM) == pytest.approx(2.0)
+
+
+def test_validations_burst_up_to_their_share(clock):
+    # A quarter of 100 requests: 25 lookups go at once, the 26th waits for the reset
+    reddit = StubReddit(100, clock.now + 100)
+    budget = make_budget(clock, reddit)
+
+    for _ in range(25):
+        budget.acquire(VALIDATION)
+        reddit.auth.limits["remaining"] -= 1
+
+    assert clock.slept == []
+
+    budget.acquire(VALIDATION)
+
+    assert clock.slept == [pytest.approx(100.0)]
+
+
+def test_exhausted_share_waits_for_reset(clock):
+    reddit = StubReddit(1, clock.now + 30)
+    budget = make_budget(clock, reddit)
+
+    budget.acquire(STREAM)
+
+    assert clock.slept == [pytest.approx(30.0)]
+
+
+def test_priorities_together_stay_within_remaining(clock):
+    reset = clock.now + 100
+    reddit = StubReddit(100, reset)
+    budget = make_budget(clock, reddit)
+    # (time, priority, sends): every priority asks again right after each request
+    events = [(clock.now, priority, False) for priority in (VALIDATION, STREAM, AUTHORS)]
+    spent = 0
+
+    while events:
+        events.sort()
+        now, priority, sends = events.pop(0)
+
+        if now >= reset:
+            continue
+
+        if sends:
+            spent += 1
+            reddit.auth.limits["remaining"] -= 1
+            events.append((now, priority, False))
+        else:
+            events.append((now + budget.delay(priority, now), priority, True))
+
+    assert 0 < spent <= 100
+
+
+def test_new_window_resets_pacing(clock):
+    reddit = StubReddit(0, clock.now + 10)
+    budget = make_budget(clock, reddit)
+
+    budget.acquire(STREAM)
+    reddit.auth.limits.update(remaining=600, reset_timestamp=clock.now + 600)
+
+    assert budget.delay(STREAM) == 0
+    assert budget.delay(STREAM) == pytest.approx(2.0)
+
+
+def test_most_exhausted_client_wins(clock):
+    # The budget only holds weak references, the clients belong to their streams
+    clients = [StubReddit(500, clock.now + 100), StubReddit(50, clock.now + 100)]
+    budget = make_budget(clock, *clients)
+
+    budget.delay(STREAM)
+
+    assert budget.delay(STREAM) == pytest.approx(4.0)
+
+
+class StubItem:
+    def __init__(self, id: str, created_utc: float) -> None:
+        self.id = id
+        self.fullname = f"t1_{id}"
+        self.created_utc = created_utc
+        self.subreddit = "python"
+        self.author = "spez"
+
+
+def test_author_mode_caps_firehose_watermark():
+    items = [StubItem("a", 100), StubItem("b", 200), StubItem("c", 300)]
+
+    assert capped_watermark(("t1_c", 300), items, until=400) == ("t1_c", 300)
+    assert capped_watermark(("t1_c", 300), items, until=250) == ("t1_b", 200)
+    assert capped_watermark(("t1_c", 300), items, until=50) is None
+
+
+def test_probe_traffic_is_scaled_to_one_poll():
+    # 11 items over 100s stand for 10 polls of 10s
+    items = [StubItem(str(n), 1000 + 10 * n) for n in range(11)]
+    traffic = TrafficStats()
+
+    traffic.observe(["python"], items, polls_covered(items, 10))
+
+    assert traffic.snapshot()["python"] == pytest.approx(1.1)
+
+
+def test_dropped_batch_holds_checkpoint():
+    checkpoints = CheckpointStore({})
+    queue = StageQueue(
+        "filter", 1, DROP_NEWEST, on_drop=lambda batch: hold_checkpoints(batch, checkpoints)
+    )
+
+    queue.put(IngestBatch([StubItem("a", 100)], [], {"comments": ("t1_a", 100)}))
+    queue.put(IngestBatch([StubItem("b", 200)], [], {"comments": ("t1_b", 200)}))
+
+    checkpoint = checkpoints.get("comments")
+    checkpoint.advance("t1_a", 100)
+    # A later batch must not move the checkpoint past the dropped item
+    checkpoint.advance("t1_c", 300)
+
+    assert (checkpoint.fullname, checkpoint.created_utc) == ("t1_a", 100)
+
+
+def test_failed_write_holds_checkpoints(monkeypatch):
+    saved = []
+    checkpoints = CheckpointStore({})
+
+    def add_comment(comment):
+        if comment.id == "b":
+            raise RuntimeError("database is locked")
+
+    monkeypatch.setattr(reddit_client, "add_comment", add_comment)
+    monkeypatch.setattr(reddit_client, "flush_notifications", lambda force=False: 0)
+    monkeypatch.setattr(reddit_client, "save_checkpoints", saved.append)
+
+    persist_batch(
+        IngestBatch([StubItem("a", 100), StubItem("b", 200)], [], {"comments": ("t1_b", 200)}),
+        checkpoints,
+    )
+    persist_batch(IngestBatch([StubItem("c", 300)], [], {"comments": ("t1_c", 300)}), checkpoints)
+
+    assert checkpoints.get("comments").fullname is None
+    assert saved == [{}]
+
+
+def notification_row(id: str) -> dict:
+    return {
+        "id": id,
+        "type": "comment",
+        "author": "spez",
+        "content": "",
+        "url": f"https://reddit.com/{id}",
+        "created_utc": 1000,
+    }
+
+
+@pytest.fixture
+def session_factory(tmp_path):
+    engine = create_db_engine(f"sqlite:///{tmp_path / 'test.db'}", "default")
+    Base.metadata.create_all(engine)
+
+    yield sessionmaker(bind=engine)
+
+    engine.dispose()
+
+
+def test_writer_requeues_rows_of_a_failed_flush(session_factory, monkeypatch):
+    calls = []
+
+    def add_notifications(session, rows):
+        calls.append([row["id"] for row in rows])
+
+        if len(calls) == 1:
+            raise RuntimeError("database is locked")
+
+        return [row["id"] for row in rows]
+
+    monkeypatch.setattr(writer_module, "add_notifications_to_db", add_notifications)
+    writer = NotificationWriter(session_factory, max_batch=10)
+    writer.add(notification_row("a"))
+
+    with pytest.raises(RuntimeError):
+        writer.flush()
+
+    writer.add(notification_row("b"))
+
+    assert writer.flush() == 2
+    assert calls == [["a"], ["a", "b"]]
+
+
+def test_writer_passes_only_inserted_rows_on(session_factory):
+    flushed = []
+    writer = NotificationWriter(session_factory, max_batch=10, on_flush=flushed.append)
+
+    writer.add(notification_row("a"))
+    writer.flush()
+    # "a" is already stored, only "b" is new
+    writer.add(notification_row("a"))
+    writer.add(notification_row("b"))
+    writer.flush()
+
+    assert [[row["id"] for row in rows] for rows in flushed] == [["a"], ["b"]]
+
+
+def test_warmed_ids_are_hits_without_counting_as_lookups():
+    cache = SeenIdCache(max_size=10)
+    cache.warm(["t1_a", "t1_b"])
+
+    assert cache.hits == cache.misses == 0
+    assert cache.check_and_add("t1_a")
+    assert not cache.check_and_add("t1_c")
+    assert cache.check_and_add("t1_c")
+    assert cache.hit_rate == pytest.approx(2 / 3)
+
+
+def test_seen_id_cache_evicts_least_recently_seen():
+    cache = SeenIdCache(max_size=2)
+    cache.warm(["t1_a", "t1_b"])
+
+    # A hit refreshes t1_a, so t1_b is the one dropped for t1_c
+    cache.check_and_add("t1_a")
+    cache.check_and_add("t1_c")
+
+    assert cache.report()["size"] == 2
+    assert cache.check_and_add("t1_a")
+    assert not cache.check_and_add("t1_b")
+
+
+def test_cadence_halves_when_listings_come_back_mostly_new():
+    cadence = StreamCadence("comments", initial=40, min_interval=5, max_interval=300)
+
+    cadence.record(fetched=100, new=90, now=1000)
+    assert cadence.interval == 20
+    assert cadence.next_due == 1020
+
+    cadence.record(fetched=100, new=100, now=1020)
+    cadence.record(fetched=100, new=100, now=1030)
+    cadence.record(fetched=100, new=100, now=1035)
+    assert cadence.interval == 5
+
+
+def test_cadence_doubles_on_empty_listings():
+    cadence = StreamCadence("comments", initial=40, min_interval=5, max_interval=300)
+
+    cadence.record(fetched=100, new=0, now=1000)
+    assert cadence.interval == 80
+
+    cadence.record(fetched=100, new=0, now=1080)
+    cadence.record(fetched=100, new=0, now=1240)
+    assert cadence.interval == 300
+    assert not cadence.is_due(now=1500)
+    assert cadence.is_due(now=1540)
+
+
+def test_plan_shards_balances_traffic():
+    traffic = {"busy": 10.0, "medium": 6.0, "quiet": 3.0, "idle": 1.0}
+
+    plan = plan_shards(["busy", "medium", "quiet", "idle"], traffic, 2, max_chars=100)
+
+    assert sorted(plan) == [["busy"], ["idle", "medium", "quiet"]]
+
+
+def test_plan_shards_opens_shards_past_the_character_cap():
+    names = [f"sub{n:02d}" for n in range(10)]
+
+    plan = plan_shards(names, {}, 1, max_chars=20)
+
+    assert sorted(name for shard in plan for name in shard) == names
+    assert all(len("+".join(shard)) <= 20 for shard in plan)
+    assert len(plan) == 4
+
+
+def test_checkpoint_only_skips_items_of_earlier_runs():
+    checkpoint = CheckpointStore({"comments": ("t1_b", 200)}).get("comments")
+    checkpoint.advance("t1_d", 400)
+
+    # Handled by the last run
+    assert not checkpoint.is_new(StubItem("a", 100))
+    # Showed up late in this run, after newer items moved the checkpoint
+    assert checkpoint.is_new(StubItem("c", 300))
+
+
+class FailingCommentsReddit:
+    """
+    Stands in for praw.Reddit: the comment listing fails, the submission listing is empty.
+    """
+
+    def subreddit(self, name: str):
+        def comments(limit: int):
+            raise RuntimeError("503 Service Unavailable")
+
+        return SimpleNamespace(comments=comments, new=lambda limit: [])
+
+
+def test_failed_stream_backs_off_alone():
+    streams = ShardedStreams(FailingCommentsReddit, poll_interval=5, max_interval=60)
+    streams.set_subreddits(["python"])
+    shard = streams._shards[0]
+
+    try:
+        started = time.time()
+        assert streams.poll() == ([], [])
+
+        assert shard.comments.cadence.failures == 1
+        assert shard.comments.cadence.next_due >= started + 10
+        assert shard.submissions.cadence.failures == 0
+
+    finally:
+        streams.close()
+
+
+def test_lookup_clients_are_not_shared_between_threads(monkeypatch):
+    monkeypatch.setattr(
+        reddit_service.praw, "Reddit", lambda **kwargs: StubReddit(None, None)
+    )
+    monkeypatch.setattr(reddit_service, "_lookup_clients", threading.local())
+    clients = []
+
+    def look_up():
+        first = reddit_service.get_lookup_reddit()
+        assert reddit_service.get_lookup_reddit() is first
+        clients.append(first)
+
+    threads = [threading.Thread(target=look_up) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len({id(client) for client in clients}) == 3
@@ -0,0 +1,306 @@
+import asyncio
+import gzip
+import heapq
+import json
+import time
+
+import pytest
+from sqlalchemy import event
+from sqlalchemy.orm import sessionmaker
+from telegram.error import RetryAfter
+
+from db import crud, retention
+from db.models import Base, Notification, WatchedRedditor
+from db.retention import RetentionPolicy, apply_retention
+from db.session import create_db_engine, create_missing_indexes
+from telegram_bot import service
+from telegram_bot.delivery import DeliveryEngine
+
+
+@pytest.fixture
+def engine(tmp_path, monkeypatch):
+    engine = create_db_engine(f"sqlite:///{tmp_path / 'test.db'}", "default")
+    Base.metadata.create_all(engine)
+    monkeypatch.setattr(service, "SessionLocal", sessionmaker(bind=engine))
+
+    yield engine
+
+    engine.dispose()
+
+
+def add_redditors(engine, count: int) -> None:
+    now = time.time()
+
+    with sessionmaker(bind=engine)() as session:
+        session.add_all(
+            WatchedRedditor(
+                username=f"redditor{n}",
+                # Every other redditor is muted, the rest had their mute run out
+                muted_until=now + 3600 if n % 2 else now - 3600,
+            )
+            for n in range(count)
+        )
+        session.commit()
+
+
+def record_queries(engine) -> list[str]:
+    statements: list[str] = []
+
+    event.listen(
+        engine,
+        "before_cursor_execute",
+        lambda conn, cursor, statement, *args: statements.append(statement),
+    )
+
+    return statements
+
+
+def test_list_muted_redditors_returns_muted_only(engine):
+    add_redditors(engine, 4)
+
+    assert sorted(service.list_muted_redditors()) == ["redditor1", "redditor3"]
+
+
+@pytest.mark.parametrize("count", [1, 10, 100])
+def test_list_muted_redditors_query_count_is_constant(engine, count):
+    add_redditors(engine, count)
+    statements = record_queries(engine)
+
+    muted = service.list_muted_redditors()
+
+    assert len(muted) == count // 2
+    assert len(statements) == 1
+
+
+def add_notification(
+    engine, id: str, author: str, created_utc: int | None = None, delivered: bool = False
+) -> None:
+    with sessionmaker(bind=engine)() as session:
+        session.add(
+            Notification(
+                id=id,
+                type="comment",
+                author=author,
+                content="",
+                url=f"https://reddit.com/{id}",
+                created_utc=int(time.time()) if created_utc is None else created_utc,
+                delivered=delivered,
+            )
+        )
+        session.commit()
+
+
+def test_pending_notifications_match_ratings_case_insensitively(engine):
+    with sessionmaker(bind=engine)() as session:
+        session.add(WatchedRedditor(username="SPEZ", rating=3))
+        session.commit()
+
+    add_notification(engine, "c1", "spez")
+
+    [page] = list(service.iter_pending_notifications(10))
+
+    assert [(note["author"], note["rating"]) for note in page] == [("spez", 3)]
+    assert service.get_ratings_of_redditors(["spez", "Spez"]) == {"spez": 3, "Spez": 3}
+
+
+def test_pending_notifications_are_not_duplicated_by_case_variants(engine):
+    with sessionmaker(bind=engine)() as session:
+        session.add(WatchedRedditor(username="SPEZ", rating=3, active=False))
+        session.add(WatchedRedditor(username="spez", rating=4))
+        session.commit()
+
+    add_notification(engine, "c1", "Spez")
+
+    [page] = list(service.iter_pending_notifications(10))
+
+    assert [note["rating"] for note in page] == [4]
+
+
+def test_rating_lookup_uses_the_lower_username_index(engine):
+    # Databases created before the index get it on the next start, a second run is a no-op
+    with engine.begin() as conn:
+        conn.exec_driver_sql("DROP INDEX ix_watched_users_username_lower")
+
+    create_missing_indexes(engine)
+    create_missing_indexes(engine)
+
+    with engine.connect() as conn:
+        plan = conn.exec_driver_sql(
+            "EXPLAIN QUERY PLAN SELECT rating FROM watched_users "
+            "WHERE lower(username) = lower('Spez')"
+        ).all()
+
+    assert "ix_watched_users_username_lower" in plan[0][-1]
+
+
+DAY = 86400
+NOW = 100 * DAY
+
+
+def add_delivered_days(engine) -> None:
+    # One delivered notification per day for days 1..10, and an old one still pending
+    for day in range(1, 11):
+        add_notification(engine, f"d{day:02d}", "spez", day * DAY, delivered=True)
+
+    add_notification(engine, "pending", "spez", DAY, delivered=False)
+
+
+def stored_ids(engine) -> list[str]:
+    with sessionmaker(bind=engine)() as session:
+        return sorted(row.id for row in session.query(Notification.id))
+
+
+def test_retention_boundary_is_the_stricter_limit(engine):
+    add_delivered_days(engine)
+
+    with sessionmaker(bind=engine)() as session:
+        # Age keeps days 8..10, 5 rows keep days 6..10
+        assert crud.get_retention_boundary(session, 8 * DAY, 5) == (8 * DAY, "")
+        # Age keeps days 3..10, 5 rows keep days 6..10
+        assert crud.get_retention_boundary(session, 3 * DAY, 5) == (6 * DAY, "d06")
+        assert crud.get_retention_boundary(session, None, 20) is None
+
+
+def test_apply_retention_archives_then_deletes(engine, tmp_path):
+    add_delivered_days(engine)
+    archive_dir = tmp_path / "archive"
+    policy = RetentionPolicy(
+        max_age_days=NOW / DAY - 3, max_rows=5, archive_dir=str(archive_dir), batch_size=2
+    )
+
+    stats = apply_retention(sessionmaker(bind=engine), engine, policy, now=NOW)
+
+    assert stats["archived"] == 5
+    assert stored_ids(engine) == ["d06", "d07", "d08", "d09", "d10", "pending"]
+
+    archived = []
+    for path in sorted(archive_dir.iterdir()):
+        with gzip.open(path) as archive:
+            archived += [json.loads(line)["id"] for line in archive]
+
+    assert archived == ["d01", "d02", "d03", "d04", "d05"]
+
+
+def test_apply_retention_keeps_rows_that_were_not_archived(engine, tmp_path, monkeypatch):
+    add_delivered_days(engine)
+
+    def archive_fails(rows, archive_dir):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(retention, "archive_notifications", archive_fails)
+    policy = RetentionPolicy(max_age_days=0, max_rows=1, archive_dir=str(tmp_path))
+
+    with pytest.raises(OSError):
+        apply_retention(sessionmaker(bind=engine), engine, policy, now=NOW)
+
+    assert len(stored_ids(engine)) == 11
+
+
+class VirtualClock:
+    """
+    Fake time for the delivery engine. Sleepers wake in time order once every task settled.
+    """
+
+    def __init__(self) -> None:
+        self.now = 0.0
+        self._sleepers: list[tuple[float, int, asyncio.Future]] = []
+
+    def __call__(self) -> float:
+        return self.now
+
+    async def sleep(self, seconds: float) -> None:
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._sleepers, (self.now + seconds, id(future), future))
+        await future
+
+    def run(self, coro):
+        async def drive():
+            task = asyncio.ensure_future(coro)
+
+            while not task.done():
+                for _ in range(20):
+                    await asyncio.sleep(0)
+
+                if self._sleepers:
+                    wake, _, future = heapq.heappop(self._sleepers)
+                    self.now = max(self.now, wake)
+                    future.set_result(None)
+
+            return task.result()
+
+        return asyncio.run(drive())
+
+
+class FakeBot:
+    def __init__(self, clock: VirtualClock, retry_after: dict[str, int] | None = None):
+        self.clock = clock
+        self.retry_after = dict(retry_after or {})
+        self.sent: list[tuple[float, str, str]] = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def send_message(self, chat_id: str, text: str) -> None:
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+
+        try:
+            await self.clock.sleep(0.01)
+
+            if self.retry_after.pop(chat_id, None):
+                raise RetryAfter(10)
+
+            self.sent.append((self.clock.now, chat_id, text))
+
+        finally:
+            self.in_flight -= 1
+
+
+def deliver(bot: FakeBot, messages: list[str], chat_ids: list[str], **limits) -> int:
+    engine = DeliveryEngine(bot, clock=bot.clock, sleep=bot.clock.sleep, **limits)
+
+    return bot.clock.run(engine.deliver(messages, chat_ids))
+
+
+def test_retry_after_pauses_only_that_chat():
+    bot = FakeBot(VirtualClock(), retry_after={"a": 10})
+
+    sent = deliver(bot, ["m0", "m1"], ["a", "b"], chat_rate=10)
+
+    assert sent == 4
+    first_a = min(when for when, chat, _ in bot.sent if chat == "a")
+    last_b = max(when for when, chat, _ in bot.sent if chat == "b")
+    assert first_a >= 10
+    assert last_b < 1
+
+
+def test_messages_keep_their_order_per_chat():
+    bot = FakeBot(VirtualClock(), retry_after={"b": 10})
+    messages = [f"m{n}" for n in range(5)]
+
+    deliver(bot, messages, ["a", "b", "c"], chat_rate=100)
+
+    for chat in ("a", "b", "c"):
+        assert [text for _, c, text in bot.sent if c == chat] == messages
+
+
+def test_global_rate_caps_all_chats():
+    bot = FakeBot(VirtualClock())
+    chats = [f"chat{n}" for n in range(20)]
+
+    deliver(bot, ["m"], chats, global_rate=5, chat_rate=100)
+
+    # A burst of the bucket's capacity, then 5 per second
+    for when, _, _ in bot.sent:
+        assert sum(1 for other, _, _ in bot.sent if other <= when) <= 5 + 5 * when + 1e-6
+    assert max(when for when, _, _ in bot.sent) >= 3
+
+
+def test_concurrent_chats_are_bounded():
+    bot = FakeBot(VirtualClock())
+
+    sent = deliver(
+        bot, ["m0", "m1"], [f"chat{n}" for n in range(10)], chat_rate=100, max_concurrency=3
+    )
+
+    assert sent == 20
+    assert bot.max_in_flight == 3